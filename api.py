@@ -1,11 +1,81 @@
+import hashlib
+import heapq
+import inspect
 from collections import namedtuple
+from functools import lru_cache
 
+import numpy
 from zencad import *
 
 Size = namedtuple('Size', ['x', 'y', 'z'])
 
 
+def fingerprint(value):
+    """
+    Returns a stable textual representation of a model parameter value.
+
+    :rtype: str
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return repr(value)
+    if isinstance(value, type):
+        name = f'{value.__module__}.{value.__qualname__}:{_source_digest(value)}'
+        if isinstance(value, Parameters):
+            # Overridden constants don't change the source, so they are part of the key
+            name += fingerprint(_parameter_values(value))
+        return name
+    if isinstance(value, dict):
+        return '{' + ','.join(f'{k!r}:{fingerprint(v)}' for k, v in sorted(value.items())) + '}'
+    if isinstance(value, (list, tuple)):
+        return '(' + ','.join(fingerprint(v) for v in value) + ')'
+    if all(hasattr(value, a) for a in ('x', 'y', 'z')):
+        # pyservoce.vector3 and pyservoce.point3
+        return fingerprint((value.x, value.y, value.z))
+    if isinstance(value, BBox):
+        return fingerprint((value.xmin, value.xmax, value.ymin, value.ymax,
+                            value.zmin, value.zmax))
+    if hasattr(value, '__dict__'):
+        return fingerprint(vars(value))
+    return repr(value)
+
+
+def _parameter_values(cls):
+    """
+    Returns the geometry constants of a `Parameters` class, inherited ones included.
+
+    :type cls: type
+    :rtype: dict[str, object]
+    """
+    values = {}
+    for base in reversed(cls.__mro__):
+        for name, value in vars(base).items():
+            if name.startswith('_') or name == 'colour' or isinstance(value, type):
+                continue
+            if (value is None or isinstance(value, (bool, int, float, str, tuple, list, dict, BBox))
+                    or all(hasattr(value, a) for a in ('x', 'y', 'z'))):
+                values[name] = value
+    return values
+
+
+@lru_cache(maxsize=None)
+def _source_digest(cls):
+    """
+    :type cls: type
+    :return: digest of the class source, so edited classes of reloaded modules differ
+    :rtype: str
+    """
+    try:
+        return hashlib.sha256(inspect.getsource(cls).encode()).hexdigest()[:16]
+    except (OSError, TypeError):
+        return ''
+
+
 class BBox(object):
+    """
+    Axis-aligned bounding box, its bounds are kept in a single tuple.
+    """
+    __slots__ = ('__bounds', '__size', '__offset', '__center_offset')
+
     def __init__(self, xmin, xmax, ymin, ymax, zmin, zmax):
         """
         :param xmin: float
@@ -15,40 +85,60 @@ class BBox(object):
         :param zmin: float
         :param zmax: float
         """
-        self.__xmin = xmin
-        self.__xmax = xmax
-        self.__ymin = ymin
-        self.__ymax = ymax
-        self.__zmin = zmin
-        self.__zmax = zmax
+        self.__bounds = (xmin, xmax, ymin, ymax, zmin, zmax)
 
         self.__size = None
         self.__offset = None
         self.__center_offset = None
 
+    @property
+    def bounds(self):
+        """
+        :return: xmin, xmax, ymin, ymax, zmin, zmax
+        :rtype: (float, float, float, float, float, float)
+        """
+        return self.__bounds
+
     @property
     def xmin(self):
-        return self.__xmin
+        return self.__bounds[0]
 
     @property
     def xmax(self):
-        return self.__xmax
+        return self.__bounds[1]
 
     @property
     def ymin(self):
-        return self.__ymin
+        return self.__bounds[2]
 
     @property
     def ymax(self):
-        return self.__ymax
+        return self.__bounds[3]
 
     @property
     def zmin(self):
-        return self.__zmin
+        return self.__bounds[4]
 
     @property
     def zmax(self):
-        return self.__zmax
+        return self.__bounds[5]
+
+    def __getstate__(self):
+        return self.__bounds
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    @staticmethod
+    def from_size(size, offset=None):
+        """
+        :type size: Size
+        :param offset: minimal corner, origin if `None`
+        :type offset: None | pyservoce.vector3
+        :rtype: BBox
+        """
+        x, y, z = (offset.x, offset.y, offset.z) if offset is not None else (0.0, 0.0, 0.0)
+        return BBox(x, x + size.x, y, y + size.y, z, z + size.z)
 
     @staticmethod
     def from_zen_bbox(bbox):
@@ -70,10 +160,11 @@ class BBox(object):
         return box(size=self.size).move(self.offset)
 
     def __add__(self, other):
+        xmin, xmax, ymin, ymax, zmin, zmax = self.__bounds
         return BBox(
-            min(self.__xmin, other.xmin), max(self.__xmax, other.xmax),
-            min(self.__ymin, other.ymin), max(self.__ymax, other.ymax),
-            min(self.__zmin, other.zmin), max(self.__zmax, other.zmax)
+            min(xmin, other.xmin), max(xmax, other.xmax),
+            min(ymin, other.ymin), max(ymax, other.ymax),
+            min(zmin, other.zmin), max(zmax, other.zmax)
         )
 
     @property
@@ -82,11 +173,8 @@ class BBox(object):
         :rtype: Size
         """
         if not self.__size:
-            self.__size = Size(
-                self.__xmax - self.__xmin,
-                self.__ymax - self.__ymin,
-                self.__zmax - self.__zmin
-            )
+            xmin, xmax, ymin, ymax, zmin, zmax = self.__bounds
+            self.__size = Size(xmax - xmin, ymax - ymin, zmax - zmin)
         return self.__size
 
     @property
@@ -95,7 +183,8 @@ class BBox(object):
         :rtype: pyservoce.vector3
         """
         if not self.__offset:
-            self.__offset = vector3(self.__xmin, self.__ymin, self.__zmin)
+            xmin, _, ymin, _, zmin, _ = self.__bounds
+            self.__offset = vector3(xmin, ymin, zmin)
         return self.__offset
 
     @property
@@ -104,55 +193,398 @@ class BBox(object):
         :rtype: pyservoce.vector3
         """
         if not self.__center_offset:
+            xmin, xmax, ymin, ymax, zmin, zmax = self.__bounds
             self.__center_offset = vector3(
-                (self.__xmax + self.__xmin) / 2.0,
-                (self.__ymax + self.__ymin) / 2.0,
-                (self.__zmax + self.__zmin) / 2.0
+                (xmax + xmin) / 2.0,
+                (ymax + ymin) / 2.0,
+                (zmax + zmin) / 2.0
             )
         return self.__center_offset
 
-    def with_border(self, width):
+    def overlaps(self, other):
+        """
+        :type other: BBox
+        :return: whether the boxes intersect or touch
+        :rtype: bool
+        """
+        xmin, xmax, ymin, ymax, zmin, zmax = self.__bounds
+        return (xmin <= other.xmax and other.xmin <= xmax and
+                ymin <= other.ymax and other.ymin <= ymax and
+                zmin <= other.zmax and other.zmin <= zmax)
+
+    def moved(self, vector):
+        """
+        :type vector: pyservoce.vector3
+        :rtype: BBox
+        """
+        xmin, xmax, ymin, ymax, zmin, zmax = self.__bounds
         return BBox(
-            self.__xmin - width,
-            self.__xmax + width,
-            self.__ymin - width,
-            self.__ymax + width,
-            self.__zmin - width,
-            self.__zmax + width
+            xmin + vector.x,
+            xmax + vector.x,
+            ymin + vector.y,
+            ymax + vector.y,
+            zmin + vector.z,
+            zmax + vector.z
         )
 
+    def with_border(self, width):
+        return self.__with_borders(width, width, width)
+
     def with_border_x(self, width):
-        return BBox(
-            self.__xmin - width,
-            self.__xmax + width,
-            self.__ymin,
-            self.__ymax,
-            self.__zmin,
-            self.__zmax
-        )
+        return self.__with_borders(width, 0.0, 0.0)
 
     def with_border_y(self, width):
-        return BBox(
-            self.__xmin,
-            self.__xmax,
-            self.__ymin - width,
-            self.__ymax + width,
-            self.__zmin,
-            self.__zmax
-        )
+        return self.__with_borders(0.0, width, 0.0)
 
     def with_border_z(self, width):
-        return BBox(
-            self.__xmin,
-            self.__xmax,
-            self.__ymin,
-            self.__ymax,
-            self.__zmin - width,
-            self.__zmax + width
-        )
+        return self.__with_borders(0.0, 0.0, width)
+
+    def __with_borders(self, x, y, z):
+        xmin, xmax, ymin, ymax, zmin, zmax = self.__bounds
+        return BBox(xmin - x, xmax + x, ymin - y, ymax + y, zmin - z, zmax + z)
+
+
+class BBoxBatch(object):
+    """
+    Many bounding boxes held in a single (N, 6) array with rows of
+    `xmin, xmax, ymin, ymax, zmin, zmax`, so operations on all of them are vectorized.
+    """
+    __slots__ = ('array',)
+
+    # Columns of minimal and maximal bounds
+    MIN = [0, 2, 4]
+    MAX = [1, 3, 5]
+
+    def __init__(self, array):
+        """
+        :param array: (N, 6) array
+        :type array: numpy.ndarray
+        """
+        self.array = array
+
+    @staticmethod
+    def from_boxes(boxes):
+        """
+        :type boxes: typing.Iterable[BBox]
+        :rtype: BBoxBatch
+        """
+        return BBoxBatch(numpy.array([b.bounds for b in boxes], dtype=float).reshape(-1, 6))
+
+    def __len__(self):
+        return len(self.array)
+
+    def __getitem__(self, item):
+        """
+        :type item: int
+        :rtype: BBox
+        """
+        return BBox(*(float(v) for v in self.array[item]))
+
+    def __iter__(self):
+        for row in self.array.tolist():
+            yield BBox(*row)
+
+    def empty(self):
+        """
+        :return: which boxes are empty, e.g. intersections of disjoint boxes
+        :rtype: numpy.ndarray
+        """
+        return (self.array[:, self.MIN] > self.array[:, self.MAX]).any(axis=1)
+
+    def union(self):
+        """
+        :return: bounding box of all boxes
+        :rtype: BBox
+        """
+        mins = self.array[:, self.MIN].min(axis=0)
+        maxs = self.array[:, self.MAX].max(axis=0)
+        return BBox(*(float(v) for v in numpy.stack([mins, maxs], axis=1).ravel()))
+
+    def intersection(self, other):
+        """
+        :param other: box intersected with every box, or boxes intersected pairwise
+        :type other: BBox | BBoxBatch
+        :return: intersections, empty ones have minimal bounds above maximal ones
+        :rtype: BBoxBatch
+        """
+        bounds = other.array if isinstance(other, BBoxBatch) else numpy.array(other.bounds)
+        array = numpy.empty(numpy.broadcast(self.array, bounds).shape)
+        array[:, self.MIN] = numpy.maximum(self.array[:, self.MIN], bounds[..., self.MIN])
+        array[:, self.MAX] = numpy.minimum(self.array[:, self.MAX], bounds[..., self.MAX])
+        return BBoxBatch(array)
+
+    def overlaps(self, other):
+        """
+        :param other: a box, or boxes compared with every box of this batch
+        :type other: BBox | BBoxBatch
+        :return: (N,) array for a box, (N, M) array for a batch of M boxes, touching boxes
+                 overlap
+        :rtype: numpy.ndarray
+        """
+        bounds = other.array if isinstance(other, BBoxBatch) else numpy.array(other.bounds)
+        if bounds.ndim == 2:
+            mins = self.array[:, None, self.MIN]
+            maxs = self.array[:, None, self.MAX]
+        else:
+            mins = self.array[:, self.MIN]
+            maxs = self.array[:, self.MAX]
+        return ((mins <= bounds[..., self.MAX]) & (bounds[..., self.MIN] <= maxs)).all(axis=-1)
+
+    def with_border(self, width):
+        """
+        :param width: border of all boxes, or (N,) array of borders of every box
+        :type width: float | numpy.ndarray
+        :rtype: BBoxBatch
+        """
+        width = numpy.reshape(width, (-1, 1))
+        array = self.array.copy()
+        array[:, self.MIN] -= width
+        array[:, self.MAX] += width
+        return BBoxBatch(array)
+
+    def distances(self, point):
+        """
+        :param point: (3,) array
+        :type point: numpy.ndarray
+        :return: distances from `point` to every box, zero inside boxes
+        :rtype: numpy.ndarray
+        """
+        outside = numpy.maximum(self.array[:, self.MIN] - point, point - self.array[:, self.MAX])
+        return numpy.linalg.norm(numpy.maximum(outside, 0.0), axis=1)
+
+    def moved(self, vector):
+        """
+        :type vector: pyservoce.vector3
+        :rtype: BBoxBatch
+        """
+        return BBoxBatch(self.array + numpy.repeat((vector.x, vector.y, vector.z), 2))
+
+
+class BoxTree(object):
+    """
+    Bounding volume hierarchy over boxes of items, nodes split their items at the median of
+    the longest axis of box centers.
+    """
+    __slots__ = ('items', 'boxes', 'bbox', 'children')
+
+    # Boxes of leaf nodes are compared at once by vectorized tests
+    LEAF_SIZE = 8
+
+    def __init__(self, items, boxes):
+        """
+        :type items: list
+        :param boxes: boxes of `items`
+        :type boxes: BBoxBatch
+        """
+        self.items = items
+        self.boxes = boxes
+        self.bbox = boxes.union() if len(boxes) else None
+        self.children = ()
+        if len(items) > self.LEAF_SIZE:
+            array = boxes.array
+            centers = (array[:, BBoxBatch.MIN] + array[:, BBoxBatch.MAX]) / 2.0
+            axis = (centers.max(axis=0) - centers.min(axis=0)).argmax()
+            order = numpy.argsort(centers[:, axis], kind='stable')
+            half = len(order) // 2
+            self.children = tuple(
+                BoxTree([items[i] for i in part], BBoxBatch(array[part]))
+                for part in (order[:half], order[half:])
+            )
+            # Inner nodes keep the boxes of their children instead of their items
+            self.items = []
+            self.boxes = BBoxBatch.from_boxes(child.bbox for child in self.children)
+
+    def query(self, region):
+        """
+        :type region: BBox
+        :return: items whose boxes overlap `region`
+        :rtype: list
+        """
+        if self.bbox is None or not self.bbox.overlaps(region):
+            return []
+        if not self.children:
+            return [i for i, hit in zip(self.items, self.boxes.overlaps(region)) if hit]
+        return [i for child in self.children for i in child.query(region)]
+
+    def nearest(self, point, count=1):
+        """
+        :type point: pyservoce.point3 | pyservoce.vector3
+        :param count: number of items
+        :type count: int
+        :return: distances from `point` to the boxes of the nearest items and the items
+        :rtype: list[(float, object)]
+        """
+        point = numpy.array((point.x, point.y, point.z))
+        # Nodes and items ordered by distances to their boxes, node boxes contain item boxes
+        queue = [(0.0, 0, self)]
+        counter = 1
+        result = []
+        while queue and len(result) < count:
+            distance, _, entry = heapq.heappop(queue)
+            if not isinstance(entry, BoxTree):
+                result.append((distance, entry))
+                continue
+            for item, item_distance in zip(entry.children or entry.items,
+                                           entry.boxes.distances(point)):
+                heapq.heappush(queue, (float(item_distance), counter, item))
+                counter += 1
+        return result
+
+    def moved(self, vector):
+        """
+        :type vector: pyservoce.vector3
+        :return: hierarchy of the same items with translated boxes
+        :rtype: BoxTree
+        """
+        tree = BoxTree.__new__(BoxTree)
+        tree.items = self.items
+        tree.boxes = self.boxes.moved(vector)
+        tree.bbox = self.bbox and self.bbox.moved(vector)
+        tree.children = tuple(child.moved(vector) for child in self.children)
+        return tree
+
+
+class Translation(object):
+    """
+    Translation which, unlike an opaque kernel transformation, lets objects move their
+    bounding boxes without kernel calls.
+    """
+
+    def __init__(self, vector):
+        """
+        :type vector: pyservoce.vector3
+        """
+        self.vector = vector
+        self.__trans = move(vector)
+
+    @property
+    def transformation(self):
+        """
+        :rtype: pyservoce.libservoce.transformation
+        """
+        return self.__trans
+
+    def __call__(self, shape):
+        """
+        :type shape: pyservoce.libservoce.Shape
+        :rtype: pyservoce.libservoce.Shape
+        """
+        return self.__trans(shape)
+
+
+def transformed_bbox(bbox, trans):
+    """
+    :type bbox: None | BBox
+    :return: bounding box after `trans`, or `None` if it can't be computed analytically
+    :rtype: None | BBox
+    """
+    if bbox is not None and isinstance(trans, Translation):
+        return bbox.moved(trans.vector)
+    return None
+
+
+def compose(outer, inner):
+    """
+    :type outer: Translation | pyservoce.libservoce.transformation | \
+                 (pyservoce.libservoce.Shape) -> pyservoce.libservoce.Shape
+    :param inner: transformation applied first, identity if `None`
+    :type inner: None | Translation | pyservoce.libservoce.transformation | \
+                 (pyservoce.libservoce.Shape) -> pyservoce.libservoce.Shape
+    :return: single transformation applying `inner` and then `outer`
+    """
+    if inner is None:
+        return outer
+    if isinstance(outer, Translation) and isinstance(inner, Translation):
+        return Translation(inner.vector + outer.vector)
+    return lambda shape: outer(inner(shape))
 
 
-class ZenObj(object):
+class BooleanBatch(object):
+    """
+    Accumulates tool shapes and applies them to a solid with a single fuse followed by a
+    single cut, instead of one boolean operation per tool.
+    """
+
+    def __init__(self):
+        self.__additions = []
+        self.__subtractions = []
+
+    def add(self, shape):
+        """
+        :type shape: pyservoce.libservoce.Shape
+        :rtype: BooleanBatch
+        """
+        self.__additions.append(shape)
+        return self
+
+    def subtract(self, shape):
+        """
+        :type shape: pyservoce.libservoce.Shape
+        :rtype: BooleanBatch
+        """
+        self.__subtractions.append(shape)
+        return self
+
+    def apply(self, shape):
+        """
+        Fuses all added tools to `shape`, then cuts all subtracted tools from the result.
+
+        :type shape: pyservoce.libservoce.Shape
+        :rtype: pyservoce.libservoce.Shape
+        """
+        if self.__additions:
+            shape = union([shape] + self.__additions)
+        if self.__subtractions:
+            shape = shape - _fused_tools(self.__subtractions)
+        return shape
+
+
+def _fused_tools(shapes):
+    """
+    Fuses tools into a single solid, so they are cut in one boolean operation. The tools
+    may overlap, so they are fused rather than collected into a compound.
+
+    :type shapes: list[pyservoce.libservoce.Shape]
+    :rtype: pyservoce.libservoce.Shape
+    """
+    return shapes[0] if len(shapes) == 1 else union(shapes)
+
+
+class OverriddenNamespace(dict):
+    """
+    Class body or module namespace which ignores assignments to overridden names.
+    """
+
+    def __init__(self, overrides):
+        """
+        :type overrides: dict[str, object]
+        """
+        super().__init__(overrides)
+        self.__overridden = frozenset(overrides)
+
+    def __setitem__(self, key, value):
+        if key not in self.__overridden:
+            super().__setitem__(key, value)
+
+
+class Parameters(type):
+    """
+    Metaclass of classes holding geometry constants.
+
+    Values in `overrides` replace the constants of the class with the matching name while
+    its body is executed, so constants derived from them stay consistent. Overrides only
+    affect classes defined, or modules reloaded, after they are set.
+
+    :type overrides: dict[str, dict[str, object]]
+    """
+    overrides = {}
+
+    @classmethod
+    def __prepare__(mcs, name, bases, **kwargs):
+        return OverriddenNamespace(mcs.overrides.get(name, {}))
+
+
+class ZenObj(object, metaclass=Parameters):
     """
     :type colour: None | Color
     """
@@ -197,6 +629,82 @@ class ZenObj(object):
         """
         pass
 
+    def leaf_objects(self, name='', colour=None, visible_only=False):
+        """
+        Subclasses override this method to enumerate simple objects with the colours they
+        are displayed with.
+
+        :param name: dotted name of this object
+        :type name: str
+        :type colour: None | Color
+        :param visible_only: skip hidden objects
+        :type visible_only: bool
+        :rtype: typing.Iterator[(str, SimpleZenObj, None | Color)]
+        """
+        return iter(())
+
+    def leaves(self, name='', colour=None, visible_only=False):
+        """
+        Enumerates shapes of simple objects with the colours they are displayed with.
+
+        :param name: dotted name of this object
+        :type name: str
+        :type colour: None | Color
+        :param visible_only: skip hidden objects
+        :type visible_only: bool
+        :rtype: typing.Iterator[(str, pyservoce.libservoce.Shape, None | Color)]
+        """
+        for leaf, obj, leaf_colour in self.leaf_objects(name, colour, visible_only):
+            yield leaf, obj.shape, leaf_colour
+
+
+class Lazy(ZenObj):
+    """
+    Proxy of an object which is built on first use and then cached. The bounding box may
+    be provided upfront, so layout computations don't build the object.
+    """
+
+    def __init__(self, factory, bbox=None):
+        """
+        :type factory: () -> ZenObj
+        :type bbox: None | BBox
+        """
+        super().__init__()
+        self.__factory = factory
+        self.__obj = None
+        self.__bbox = bbox
+
+    @property
+    def obj(self):
+        """
+        :rtype: ZenObj
+        """
+        if self.__obj is None:
+            self.__obj = self.__factory()
+        return self.__obj
+
+    def display(self, trans=None, colour=None):
+        self.obj.display(trans, colour=colour)
+
+    def bbox(self):
+        if self.__bbox is None:
+            self.__bbox = self.obj.bbox()
+        return self.__bbox
+
+    def transformed(self, trans):
+        if self.__obj is not None:
+            return self.__obj.transformed(trans)
+        # The copy builds this object on first use, so both share its geometry
+        return Lazy(lambda: self.obj.transformed(trans), transformed_bbox(self.__bbox, trans))
+
+    def leaf_objects(self, name='', colour=None, visible_only=False):
+        return self.obj.leaf_objects(name, colour=colour, visible_only=visible_only)
+
+    def __getattr__(self, item):
+        if item.startswith('_Lazy__'):
+            raise AttributeError(item)
+        return getattr(self.obj, item)
+
 
 class CompoundZenObj(ZenObj):
     def __init__(self, *args, colour=None, **kwargs):
@@ -209,6 +717,8 @@ class CompoundZenObj(ZenObj):
         self.__objects = list(args)
         self.__objects_dict = dict(**kwargs)
         self.__hidden = []
+        self.__bbox = None
+        self.__index = None
 
     def hide(self, name):
         self.__hidden.append(name)
@@ -225,17 +735,81 @@ class CompoundZenObj(ZenObj):
                 o.display(trans, colour=colour or self.colour)
 
     def bbox(self):
-        boxes = [o.bbox() for o in self.__all_objects()]
-        return BBox(
-            min(b.xmin for b in boxes), max(b.xmax for b in boxes),
-            min(b.ymin for b in boxes), max(b.ymax for b in boxes),
-            min(b.zmin for b in boxes), max(b.zmax for b in boxes)
-        )
+        if self.__bbox is None:
+            self.__bbox = BBoxBatch.from_boxes(o.bbox() for o in self.__all_objects()).union()
+        return self.__bbox
 
     def transformed(self, trans):
         objects = [o.transformed(trans) for o in self.__objects]
         objects_dict = {k: v.transformed(trans) for k, v in self.__objects_dict.items()}
-        return CompoundZenObj(*objects, colour=self.colour, **objects_dict)
+        result = CompoundZenObj(*objects, colour=self.colour, **objects_dict)
+        # Translated copies move the bounds and the index instead of rebuilding them
+        result.__bbox = transformed_bbox(self.__bbox, trans)
+        if self.__index is not None and isinstance(trans, Translation):
+            result.__index = self.__index.moved(trans.vector)
+        return result
+
+    def __children(self):
+        """
+        :return: names and objects of children, positional ones are named by their indices
+        :rtype: list[(str, ZenObj)]
+        """
+        return ([(str(i), o) for i, o in enumerate(self.__objects)] +
+                list(self.__objects_dict.items()))
+
+    def index(self):
+        """
+        Spatial index of children by their bounding boxes, built on first use. Lazy children
+        are indexed by their known bounding boxes without being built.
+
+        :return: hierarchy over positions of children in `__children()`
+        :rtype: BoxTree
+        """
+        if self.__index is None:
+            children = self.__children()
+            self.__index = BoxTree(list(range(len(children))),
+                                   BBoxBatch.from_boxes(o.bbox() for _, o in children))
+        return self.__index
+
+    def query(self, region, deep=False):
+        """
+        Finds children whose bounding boxes overlap `region`.
+
+        :type region: BBox
+        :param deep: return overlapping descendants of compound children instead of them
+        :type deep: bool
+        :return: names and objects, names of descendants are dotted paths
+        :rtype: list[(str, ZenObj)]
+        """
+        children = self.__children()
+        found = []
+        for i in sorted(self.index().query(region)):
+            name, o = children[i]
+            if deep and isinstance(o, CompoundZenObj):
+                found.extend((f'{name}.{n}', d) for n, d in o.query(region, deep))
+            else:
+                found.append((name, o))
+        return found
+
+    def nearest(self, point, count=1):
+        """
+        Finds children nearest to `point` by distances to their bounding boxes.
+
+        :type point: pyservoce.point3 | pyservoce.vector3
+        :type count: int
+        :return: distances, names and objects ordered by distances, zero inside boxes
+        :rtype: list[(float, str, ZenObj)]
+        """
+        children = self.__children()
+        return [(d, *children[i]) for d, i in self.index().nearest(point, count)]
+
+    def leaf_objects(self, name='', colour=None, visible_only=False):
+        prefix = f'{name}.' if name else ''
+        for i, o in enumerate(self.__objects):
+            yield from o.leaf_objects(f'{prefix}{i}', colour or self.colour, visible_only)
+        for k, o in self.__objects_dict.items():
+            if not (visible_only and k in self.__hidden):
+                yield from o.leaf_objects(f'{prefix}{k}', colour or self.colour, visible_only)
 
     def __getitem__(self, item):
         """
@@ -256,20 +830,63 @@ class CompoundZenObj(ZenObj):
 
 
 class SimpleZenObj(ZenObj):
-    def __init__(self, shape, colour=None):
+    def __init__(self, shape, colour=None, bbox=None, placement=None):
         """
+        :param shape: shape in local coordinates, shared by copies with other placements
         :type shape: pyservoce.libservoce.Shape
         :type colour: None | Color
+        :param bbox: known bounding box of the placed shape, computed by the kernel if `None`
+        :type bbox: None | BBox
+        :param placement: transformation from local to world coordinates, identity if `None`
+        :type placement: None | Translation | pyservoce.libservoce.transformation | \
+                         (pyservoce.libservoce.Shape) -> pyservoce.libservoce.Shape
         """
         super().__init__(colour)
-        self.shape = shape
+        self.base_shape = shape
+        self.placement = placement
+        self.__shape = shape if placement is None else None
+        self.__bbox = bbox or (self.analytic_bbox() if placement is None else None)
+
+    @property
+    def shape(self):
+        """
+        Shape in world coordinates, the placement is applied on first use.
+
+        :rtype: pyservoce.libservoce.Shape
+        """
+        if self.__shape is None:
+            self.__shape = self.placement(self.base_shape)
+        return self.__shape
+
+    @classmethod
+    def analytic_bbox(cls):
+        """
+        Subclasses with fully known geometry override this method to provide the bounding
+        box without kernel calls.
+
+        :rtype: None | BBox
+        """
+        return None
 
     def display(self, trans=None, colour=None):
+        if trans is None and isinstance(self.placement, Translation):
+            # Copies of a base shape share its tessellation, the viewer only moves them
+            display(self.base_shape, color=colour or self.colour).relocate(
+                self.placement.transformation)
+            return
         display(trans(self.shape) if trans else self.shape,
                 color=colour or self.colour)
 
     def bbox(self):
-        return BBox.from_zen_bbox(self.shape.bbox())
+        if self.__bbox is None:
+            self.__bbox = BBox.from_zen_bbox(self.shape.bbox())
+        return self.__bbox
 
     def transformed(self, trans):
-        return SimpleZenObj(trans(self.shape), colour=self.colour)
+        # Copies share the base shape, only their placements differ
+        return SimpleZenObj(self.base_shape, colour=self.colour,
+                            bbox=transformed_bbox(self.__bbox, trans),
+                            placement=compose(trans, self.placement))
+
+    def leaf_objects(self, name='', colour=None, visible_only=False):
+        yield name, self, colour or self.colour
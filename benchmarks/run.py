@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Benchmarks of model construction and STL export.
+
+Every benchmark runs `--warmup` times unmeasured and `--repeat` times measured. Results are
+saved to a JSON file, two such files can be compared with `--compare`.
+
+ZenCad's evaluation cache and the feature memo of the case parts are disabled, so every
+run measures a full rebuild.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import evalcache  # noqa: E402
+import headless  # noqa: E402, F401
+import zencad  # noqa: E402
+
+from case_model import CaseBottom, CaseTop  # noqa: E402
+from export import write_adaptive_stl, write_stl  # noqa: E402
+from main import create_internals, create_model  # noqa: E402
+
+DELTAS = [0.1, 0.03, 0.01]
+# Defaults of `main.py --adaptive`
+ADAPTIVE = {'planar_delta': 0.1, 'curved_delta': 0.01, 'angular_tolerance': math.radians(15)}
+
+
+def _clear_memo():
+    CaseTop.features.clear()
+    CaseBottom.features.clear()
+
+
+def bench_create_model():
+    _clear_memo()
+    create_model()
+
+
+def bench_case_part(cls, preview=False):
+    device, battery = create_internals()
+
+    def bench():
+        _clear_memo()
+        cls(device, battery, preview=preview)
+    return bench
+
+
+def bench_bbox():
+    all_objects = create_model()
+    # A kernel transformation, unlike `Translation`, can't move memoized boxes, so every
+    # copy computes the boxes of its leaves
+    identity = zencad.move(0, 0, 0)
+
+    def prepare():
+        copy = all_objects.transformed(identity)
+        # The transformation is applied here, so only the boxes are measured
+        for _, shape, _ in copy.leaves():
+            evalcache.unlazy_if_need(shape)
+        return copy
+
+    def bench(copy):
+        copy.bbox()
+    return prepare, bench
+
+
+def bench_bbox_memoized():
+    all_objects = create_model()
+    all_objects.bbox()
+
+    def bench():
+        all_objects.bbox()
+    return bench
+
+
+def bench_to_stl(name, delta):
+    shape = create_model().case[name].shape
+
+    def bench():
+        with tempfile.TemporaryDirectory() as directory:
+            zencad.to_stl(shape, os.path.join(directory, f'{name}.stl'), delta)
+    return bench
+
+
+def bench_write_stl(name, delta):
+    shape = create_model().case[name].shape
+
+    def bench():
+        with tempfile.TemporaryDirectory() as directory:
+            return write_stl(shape, os.path.join(directory, f'{name}.stl'), delta)
+    return bench
+
+
+def bench_adaptive_stl(name):
+    shape = create_model().case[name].shape
+
+    def bench():
+        with tempfile.TemporaryDirectory() as directory:
+            return write_adaptive_stl(shape, os.path.join(directory, f'{name}.stl'), **ADAPTIVE)
+    return bench
+
+
+def benchmarks():
+    """
+    :return: benchmark functions by name, setup is done lazily when a benchmark runs;
+        export benchmarks return `ExportStats`, so triangle counts are reported too. Setup
+        may also return an unmeasured function which prepares the argument of every run.
+    :rtype: dict[str, () -> (() -> None | ExportStats) | (() -> T, (T) -> None)]
+    """
+    result = {
+        'create_model': lambda: bench_create_model,
+        'case_top': lambda: bench_case_part(CaseTop),
+        'case_bottom': lambda: bench_case_part(CaseBottom),
+        'case_top.preview': lambda: bench_case_part(CaseTop, preview=True),
+        'case_bottom.preview': lambda: bench_case_part(CaseBottom, preview=True),
+        'all_objects.bbox': bench_bbox,
+        'all_objects.bbox.memoized': bench_bbox_memoized,
+    }
+    for name in ('top', 'bottom'):
+        for delta in DELTAS:
+            result[f'to_stl.{name}.{delta}'] = (lambda n=name, d=delta: bench_to_stl(n, d))
+            result[f'write_stl.{name}.{delta}'] = (lambda n=name, d=delta: bench_write_stl(n, d))
+        result[f'adaptive_stl.{name}'] = (lambda n=name: bench_adaptive_stl(n))
+    return result
+
+
+def measure(bench, repeat, warmup, prepare=None):
+    """
+    :type bench: (() -> None | ExportStats) | (T) -> None | ExportStats
+    :type repeat: int
+    :type warmup: int
+    :param prepare: makes the argument of `bench` before every run, not measured
+    :type prepare: None | () -> T
+    :return: wall times of measured runs in seconds and the result of the last run
+    :rtype: (list[float], None | ExportStats)
+    """
+    args = (lambda: (prepare(),)) if prepare else (lambda: ())
+    for _ in range(warmup):
+        bench(*args())
+
+    times = []
+    result = None
+    for _ in range(repeat):
+        a = args()
+        start = time.perf_counter()
+        result = bench(*a)
+        times.append(time.perf_counter() - start)
+    return times, result
+
+
+def _commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(__file__),
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(output, repeat, warmup, selected=None):
+    """
+    :type output: str
+    :type repeat: int
+    :type warmup: int
+    :param selected: names of benchmarks to run, all by default
+    :type selected: None | list[str]
+    """
+    results = {}
+    for name, setup in benchmarks().items():
+        if selected and name not in selected:
+            continue
+        bench = setup()
+        prepare = None
+        if isinstance(bench, tuple):
+            prepare, bench = bench
+        times, stats = measure(bench, repeat, warmup, prepare)
+        results[name] = {
+            'times': times,
+            'min': min(times),
+            'median': statistics.median(times),
+            'mean': statistics.mean(times),
+        }
+        line = (f'{name:<28} min {results[name]["min"]:8.3f} s  '
+                f'median {results[name]["median"]:8.3f} s')
+        if stats is not None:
+            results[name]['triangles'] = stats.triangles
+            line += f'  {stats.triangles:>9} triangles'
+        print(line)
+
+    with open(output, 'w') as f:
+        json.dump({
+            'commit': _commit(),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'repeat': repeat,
+            'warmup': warmup,
+            'results': results,
+        }, f, indent=2)
+    print(f'Results written to {output}')
+
+
+def compare(base_path, new_path):
+    """
+    Prints median times of two result files and their ratio, and triangle counts of export
+    benchmarks.
+
+    :type base_path: str
+    :type new_path: str
+    """
+    with open(base_path) as f:
+        base = json.load(f)['results']
+    with open(new_path) as f:
+        new = json.load(f)['results']
+
+    print(f'{"benchmark":<28} {"base, s":>9} {"new, s":>9} {"ratio":>7} {"triangles":>21}')
+    for name in sorted(set(base) & set(new)):
+        b = base[name]['median']
+        n = new[name]['median']
+        line = f'{name:<28} {b:9.3f} {n:9.3f} {n / b if b else float("nan"):7.2f}'
+        if 'triangles' in base[name] and 'triangles' in new[name]:
+            line += f' {base[name]["triangles"]:>10} {new[name]["triangles"]:>10}'
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Model construction and export benchmarks')
+    parser.add_argument('benchmarks', nargs='*', help='names of benchmarks to run')
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'),
+                        help='compare two result files instead of running benchmarks')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    zencad.disable_cache()
+    run(args.output, args.repeat, args.warmup, args.benchmarks)
+
+
+if __name__ == '__main__':
+    main()
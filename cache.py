@@ -0,0 +1,215 @@
+"""
+Persistent content-addressed cache for built case shapes.
+
+Entries are keyed by a digest of every model input: the `config` values, the geometry
+constants of the case and device classes, and the source code of the model modules.
+A repeated run with unchanged inputs loads the serialized BREP or copies the exported
+files instead of rebuilding the shapes, and reuses meshes instead of tessellating again.
+Shapes can be stored with their kernel tessellation, so the viewer displays shapes loaded
+later without meshing them again.
+"""
+import hashlib
+import inspect
+import os
+import shutil
+import time
+
+from zencad import to_brep, from_brep
+
+import api
+import case_model
+import config
+import device_model
+import features
+from api import SimpleZenObj, ZenObj, fingerprint
+from export import Mesh, export_format, face_meshes
+from features import FeatureGraph
+
+
+def _class_parameters(cls):
+    """
+    Returns public, non-callable class attributes which define the geometry.
+
+    :type cls: type
+    :rtype: dict[str, object]
+    """
+    return {
+        k: v for k, v in vars(cls).items()
+        if not k.startswith('_') and k != 'colour' and not callable(v) and
+        not isinstance(v, (property, staticmethod, classmethod, FeatureGraph))
+    }
+
+
+def _model_classes():
+    """
+    :rtype: list[type]
+    """
+    classes = [case_model.CaseProperties]
+    for module in (device_model, case_model):
+        classes.extend(
+            c for _, c in inspect.getmembers(module, inspect.isclass)
+            if c.__module__ == module.__name__ and issubclass(c, ZenObj)
+        )
+    return classes
+
+
+def model_digest():
+    """
+    Computes a digest of every input of the model.
+
+    :rtype: str
+    """
+    digest = hashlib.sha256()
+    for name in sorted(vars(config)):
+        if name.isupper():
+            digest.update(f'config.{name}={fingerprint(getattr(config, name))};'.encode())
+    for cls in _model_classes():
+        digest.update(f'{cls.__qualname__}={fingerprint(_class_parameters(cls))};'.encode())
+    for module in (api, features, device_model, case_model):
+        digest.update(inspect.getsource(module).encode())
+    return digest.hexdigest()
+
+
+class ShapeCache(object):
+    def __init__(self, directory, max_size=None, max_age=None, mesh_delta=None):
+        """
+        :param directory: cache directory, created if missing
+        :type directory: str
+        :param max_size: maximum total size of the cache in bytes
+        :type max_size: None | int
+        :param max_age: maximum age of an unused entry in seconds
+        :type max_age: None | float
+        :param mesh_delta: chordal deviation of the tessellation stored with built shapes,
+                           the viewer reuses it if it is finer than its own
+        :type mesh_delta: None | float
+        """
+        self.directory = directory
+        self.max_size = max_size
+        self.max_age = max_age
+        self.mesh_delta = mesh_delta
+        os.makedirs(directory, exist_ok=True)
+
+    def __path(self, key, name, suffix):
+        return os.path.join(self.directory, f'{key}-{name}{suffix}')
+
+    def __hit(self, path):
+        if not os.path.exists(path):
+            return False
+        # Mark the entry as recently used, eviction removes the least recently used ones
+        os.utime(path)
+        return True
+
+    def load_shape(self, key, name):
+        """
+        :type key: str
+        :type name: str
+        :rtype: None | pyservoce.libservoce.Shape
+        """
+        path = self.__path(key, name, '.brep')
+        return from_brep(path) if self.__hit(path) else None
+
+    def store_shape(self, key, name, shape):
+        """
+        :type key: str
+        :type name: str
+        :type shape: pyservoce.libservoce.Shape
+        """
+        path = self.__path(key, name, '.brep')
+        to_brep(shape, path + '.tmp')
+        os.replace(path + '.tmp', path)
+
+    def load_export(self, key, name, tag, path):
+        """
+        Copies the cached export file in the format of `path` to `path`.
+
+        :type key: str
+        :type name: str
+        :param tag: identifier of the export settings
+        :type tag: str
+        :type path: str
+        :return: `False` if there is no such entry
+        :rtype: bool
+        """
+        cached = self.__path(key, name, f'-{tag}{export_format(path)}')
+        if not self.__hit(cached):
+            return False
+        shutil.copyfile(cached, path)
+        return True
+
+    def store_export(self, key, name, tag, path):
+        """
+        :type key: str
+        :type name: str
+        :param tag: identifier of the export settings
+        :type tag: str
+        :type path: str
+        """
+        cached = self.__path(key, name, f'-{tag}{export_format(path)}')
+        shutil.copyfile(path, cached + '.tmp')
+        os.replace(cached + '.tmp', cached)
+
+    def load_mesh(self, key, name, tag):
+        """
+        :type key: str
+        :type name: str
+        :param tag: identifier of the tessellation settings
+        :type tag: str
+        :rtype: None | Mesh
+        """
+        path = self.__path(key, name, f'-{tag}.mesh')
+        return Mesh.read(path) if self.__hit(path) else None
+
+    def store_mesh(self, key, name, tag, mesh):
+        """
+        :type key: str
+        :type name: str
+        :param tag: identifier of the tessellation settings
+        :type tag: str
+        :type mesh: Mesh
+        """
+        path = self.__path(key, name, f'-{tag}.mesh')
+        mesh.write(path + '.tmp')
+        os.replace(path + '.tmp', path)
+
+    def build(self, name, cls, *args, **kwargs):
+        """
+        Loads the shape of `cls(*args, **kwargs)` from the cache, or builds and stores it.
+
+        :type name: str
+        :type cls: type[SimpleZenObj]
+        :rtype: SimpleZenObj
+        """
+        key = model_digest()
+        shape = self.load_shape(key, name)
+        if shape is not None:
+            return SimpleZenObj(shape, colour=cls.colour)
+
+        obj = cls(*args, **kwargs)
+        if self.mesh_delta:
+            # Triangulations are kept by the faces of the shape and written to BREP files
+            for _ in face_meshes(obj.shape, self.mesh_delta):
+                pass
+        self.store_shape(key, name, obj.shape)
+        return obj
+
+    def evict(self):
+        """
+        Removes entries older than `max_age`, then the least recently used entries until
+        the cache fits into `max_size`.
+        """
+        entries = []
+        for file_name in os.listdir(self.directory):
+            path = os.path.join(self.directory, file_name)
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        now = time.time()
+        total_size = sum(size for _, size, _ in entries)
+        for mtime, size, path in entries:
+            expired = self.max_age is not None and now - mtime > self.max_age
+            oversized = self.max_size is not None and total_size > self.max_size
+            if not (expired or oversized):
+                continue
+            os.remove(path)
+            total_size -= size
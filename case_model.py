@@ -1,16 +1,22 @@
+from functools import lru_cache, partial
 from math import cos
 
 from zencad import *
 
-from api import SimpleZenObj, Size, BBox, CompoundZenObj
+from api import (
+    SimpleZenObj, Size, BBox, CompoundZenObj, Parameters, BooleanBatch, Lazy,
+    Translation
+)
 from config import EPS, EPS2
 from device_model import (
     Pcb, Battery, LcdWires, Device, Socket, ButtonCap, LcdMount, LcdLock1, LcdLock2, ScrewBase,
     ScrewSilver, ScrewBlack, PowerTerminals
 )
+from features import FeatureGraph
+from profiler import stage
 
 
-class CaseProperties(object):
+class CaseProperties(object, metaclass=Parameters):
     default_margin = 1.0
 
     pcb_margin = 1.8
@@ -64,6 +70,34 @@ class CaseProperties(object):
     battery_frame_width = 1.5
 
 
+def _contact_pads_bbox(device):
+    """
+    :type device: Device
+    :rtype: BBox
+    """
+    contact_pads_bbox = device.contact_pads.bbox()  # type: BBox
+    contact_pads_bbox = contact_pads_bbox.with_border_x(CaseProperties.contact_pads_margin)
+    contact_pads_bbox = contact_pads_bbox.with_border_y(CaseProperties.contact_pads_margin)
+    return contact_pads_bbox.with_border_z(EPS)
+
+
+def _contact_pads_hole(device):
+    """
+    :type device: Device
+    :rtype: pyservoce.libservoce.Shape
+    """
+    contact_pads_bbox = _contact_pads_bbox(device)
+    return box(size=(
+        contact_pads_bbox.size.x,
+        contact_pads_bbox.ymax + CaseProperties.width + EPS,
+        CaseProperties.size.z + CaseProperties.width - contact_pads_bbox.zmin
+    )).move(vector3(
+        contact_pads_bbox.offset.x,
+        -CaseProperties.width - EPS,
+        contact_pads_bbox.zmin
+    ))
+
+
 class CaseTop(SimpleZenObj):
     colour = color.white
 
@@ -71,45 +105,70 @@ class CaseTop(SimpleZenObj):
     offset_z = CaseProperties.size.z - size.z
     bottom_center = (size.x / 2, size.y / 2, 0.0)
 
-    def __init__(self, device, battery):
+    features = FeatureGraph('case_top')
+
+    def __init__(self, device, battery, preview=False):
         """
         :type device: Device
         :type battery: Battery
+        :param preview: skip fillets and face unification
+        :type preview: bool
         """
+        super().__init__(self.features.build(device, preview))
+
+    @features.feature('shell', params=(
+            'CaseTop.size', 'CaseTop.offset_z', 'CaseTop.bottom_center', 'CaseProperties.width'
+    ))
+    def shell(case, device):
         case = thicksolid(
-            proto=box(size=self.size),
+            proto=box(size=CaseTop.size),
             t=CaseProperties.width,
-            refs=[self.bottom_center]
+            refs=[CaseTop.bottom_center]
         )
-        case = case.moveZ(self.offset_z)
+        return case.moveZ(CaseTop.offset_z)
 
+    @features.feature('battery_wall', params=(
+            'CaseTop.size', 'CaseTop.offset_z', 'CaseProperties.battery_wall_width',
+            'CaseProperties.battery_wall_offset_x'
+    ))
+    def battery_wall(case, device):
         battery_wall = box(size=(
             CaseProperties.battery_wall_width,
-            self.size.y + EPS2,
+            CaseTop.size.y + EPS2,
             EPS + EPS
         )).move(vector3(
             CaseProperties.battery_wall_offset_x,
             -EPS,
-            self.offset_z
+            CaseTop.offset_z
         ))
-        case = case + battery_wall
+        return case + battery_wall
 
+    @features.feature('screen_frame', params=(
+            'CaseTop.size', 'CaseTop.offset_z', 'CaseProperties.size',
+            'CaseProperties.screen_margin', 'CaseProperties.battery_wall_offset_x'
+    ), parts=('lcd_screen',))
+    def screen_frame(case, device):
         screen_frame_width = (CaseProperties.size.z -
                               device.lcd_screen.bbox().zmax - CaseProperties.screen_margin)
         screen_frame = box(size=(
             CaseProperties.battery_wall_offset_x - EPS2,
-            self.size.y - EPS2,
+            CaseTop.size.y - EPS2,
             screen_frame_width + EPS
         )).move(vector3(
             EPS, EPS, CaseProperties.size.z - screen_frame_width
         ))
         screen_frame_filler = box(size=(
             CaseProperties.battery_wall_offset_x + EPS2,
-            self.size.y + EPS2,
-            self.size.z + EPS
-        )).move(vector3(-EPS, -EPS, self.offset_z))
-        case = case + screen_frame_filler + screen_frame
-
+            CaseTop.size.y + EPS2,
+            CaseTop.size.z + EPS
+        )).move(vector3(-EPS, -EPS, CaseTop.offset_z))
+        return case + screen_frame_filler + screen_frame
+
+    @features.feature('controls_frame', params=(
+            'CaseProperties.size', 'CaseProperties.default_margin',
+            'CaseProperties.battery_wall_offset_x'
+    ), parts=('lcd', 'pcb'))
+    def controls_frame(case, device):
         controls_frame = box(size=(
             CaseProperties.battery_wall_offset_x - EPS2,
             device.lcd.bbox().ymin - CaseProperties.default_margin - EPS,
@@ -118,8 +177,14 @@ class CaseTop(SimpleZenObj):
         )).move(vector3(
             EPS, EPS, device.pcb.bbox().zmax
         ))
-        case = case + controls_frame
-
+        return case + controls_frame
+
+    @features.feature('battery_frame', params=(
+            'CaseProperties.size', 'CaseProperties.battery_wall_offset_x',
+            'CaseProperties.battery_wall_width', 'CaseProperties.battery_frame_height',
+            'CaseProperties.battery_frame_width'
+    ))
+    def battery_frame(case, device):
         battery_frame = box(size=(
             CaseProperties.size.x - CaseProperties.battery_wall_offset_x -
             CaseProperties.battery_wall_width - EPS2,
@@ -137,29 +202,41 @@ class CaseTop(SimpleZenObj):
             EPS,
             CaseProperties.size.z - CaseProperties.battery_frame_height
         ))
-        case = case + battery_frame
-
+        return case + battery_frame
+
+    @features.feature('screw_mounts', params=(
+            'CaseScrews.screw_info_dict', 'CaseProperties.size',
+            'CaseProperties.screw_mount_width', 'CaseProperties.screw_length_margin'
+    ), parts=('pcb',))
+    def screw_mounts(case, device):
+        batch = BooleanBatch()
         for info in CaseScrews.screw_info_dict.values():
             screw_mount_offset = vector3(
                 info.screw_offset.x, info.screw_offset.y,
                 device.pcb.bbox().zmax
             )
-            screw_mount = cylinder(
+            batch.add(cylinder(
                 r=info.screw_class.radius + CaseProperties.screw_mount_width,
                 # full contact with PCB, no gaps
                 h=CaseProperties.size.z - device.pcb.bbox().zmax + EPS
-            ).move(screw_mount_offset)
-            case = case + screw_mount
+            ).move(screw_mount_offset))
 
             screw_layer_width = device.pcb.bbox().zmax - info.screw_offset.z
-            screw_hole = cylinder(
+            batch.subtract(cylinder(
                 r=info.screw_class.radius,
                 h=info.screw_class.length - screw_layer_width + CaseProperties.screw_length_margin
-            ).move(screw_mount_offset)
-            case = case - screw_hole
-
-        case = unify(case)
-
+            ).move(screw_mount_offset))
+        return batch.apply(case)
+
+    @features.feature('unify', cosmetic=True)
+    def unify_faces(case, device):
+        return unify(case)
+
+    @features.feature('socket_hole', params=(
+            'Socket.room_size', 'CaseProperties.width', 'CaseProperties.pcb_margin',
+            'CaseProperties.socket_margin'
+    ), parts=('socket',))
+    def socket_hole(case, device):
         socket_bbox = device.socket.bbox().with_border(CaseProperties.socket_margin)
         lever_hole = box(size=(
             CaseProperties.width + CaseProperties.pcb_margin + EPS2,
@@ -172,8 +249,13 @@ class CaseTop(SimpleZenObj):
             CaseProperties.socket_margin
         ))
         socket_hole = box(socket_bbox.size).move(socket_bbox.offset)
-        case = case - socket_hole - lever_hole
+        return case - socket_hole - lever_hole
 
+    @features.feature('button_hole', params=(
+            'ButtonCap.radius', 'ButtonCap.height', 'CaseProperties.size',
+            'CaseProperties.button_cap_margin', 'CaseProperties.default_margin'
+    ), parts=('button_cap', 'pcb'))
+    def button_hole(case, device):
         cap_bbox = device.button_cap.bbox()  # type: BBox
         cap_hole = cylinder(
             r=ButtonCap.radius + CaseProperties.button_cap_margin,
@@ -194,8 +276,12 @@ class CaseTop(SimpleZenObj):
             cap_bbox.offset.y - CaseProperties.default_margin,
             device.pcb.bbox().zmax
         ))
-        case = case - button_hole
+        return case - button_hole
 
+    @features.feature('screen_hole', params=(
+            'CaseProperties.size', 'CaseProperties.width'
+    ), parts=('lcd_screen',))
+    def screen_hole(case, device):
         screen_bbox = device.lcd_screen.bbox()  # type: BBox
         screen_hole = box(size=(
             screen_bbox.size.x - EPS2,
@@ -206,25 +292,22 @@ class CaseTop(SimpleZenObj):
             screen_bbox.ymin + EPS,
             screen_bbox.zmax
         ))
-        case = case - screen_hole
-
-        contact_pads_bbox = device.contact_pads.bbox()  # type: BBox
-        contact_pads_bbox = contact_pads_bbox.with_border_x(CaseProperties.contact_pads_margin)
-        contact_pads_bbox = contact_pads_bbox.with_border_y(CaseProperties.contact_pads_margin)
-        contact_pads_bbox = contact_pads_bbox.with_border_z(EPS)
-        contact_pads_hole = box(size=(
-            contact_pads_bbox.size.x,
-            contact_pads_bbox.ymax + CaseProperties.width + EPS,
-            CaseProperties.size.z + CaseProperties.width - contact_pads_bbox.zmin
-        )).move(vector3(
-            contact_pads_bbox.offset.x,
-            -CaseProperties.width - EPS,
-            contact_pads_bbox.zmin
-        ))
-        case = case - contact_pads_hole
-
+        return case - screen_hole
+
+    @features.feature('contact_pads_hole', params=(
+            'CaseProperties.size', 'CaseProperties.width', 'CaseProperties.contact_pads_margin'
+    ), parts=('contact_pads',))
+    def contact_pads_hole(case, device):
+        return case - _contact_pads_hole(device)
+
+    @features.feature('holes_fillet', params=(
+            'CaseProperties.size', 'CaseProperties.width', 'CaseProperties.contact_pads_margin'
+    ), parts=('contact_pads', 'button_cap', 'lcd_screen'), cosmetic=True)
+    def holes_fillet(case, device):
+        contact_pads_bbox = _contact_pads_bbox(device)
+        cap_bbox = device.button_cap.bbox()  # type: BBox
         lcd_screen_bbox = device.lcd_screen.bbox()  # type: BBox
-        case = fillet(case, r=CaseProperties.width / 2, refs=points([
+        return fillet(case, r=CaseProperties.width / 2, refs=points([
             (contact_pads_bbox.center_offset.x, contact_pads_bbox.ymax,
              CaseProperties.size.z + CaseProperties.width),
             (contact_pads_bbox.xmin, 1, CaseProperties.size.z + CaseProperties.width),
@@ -240,8 +323,12 @@ class CaseTop(SimpleZenObj):
              CaseProperties.size.z + CaseProperties.width),
         ]))
 
+    @features.feature('socket_fillet', params=(
+            'Socket.room_size', 'CaseProperties.socket_margin'
+    ), parts=('socket',), cosmetic=True)
+    def socket_fillet(case, device):
         socket_bbox = device.socket.bbox()  # type: BBox
-        case = fillet(case, r=1.4, refs=points([
+        return fillet(case, r=1.4, refs=points([
             (socket_bbox.xmin, socket_bbox.center_offset.y, socket_bbox.zmax),
             (socket_bbox.xmax, socket_bbox.center_offset.y, socket_bbox.zmax),
             (socket_bbox.center_offset.x, socket_bbox.ymin, socket_bbox.zmax),
@@ -250,7 +337,12 @@ class CaseTop(SimpleZenObj):
              socket_bbox.zmax),
         ]))
 
-        case = fillet(case, r=1.0, refs=points([
+    @features.feature('walls_fillet', params=(
+            'CaseProperties.size', 'CaseProperties.battery_wall_offset_x',
+            'CaseProperties.battery_wall_width'
+    ), cosmetic=True)
+    def walls_fillet(case, device):
+        return fillet(case, r=1.0, refs=points([
             (0, 0, CaseProperties.size.z - 0.5),
             (0, CaseProperties.size.y, CaseProperties.size.z - 0.5),
             (CaseProperties.battery_wall_offset_x,
@@ -265,8 +357,6 @@ class CaseTop(SimpleZenObj):
             (CaseProperties.size.x, CaseProperties.size.y, CaseProperties.size.z - 0.5),
         ]))
 
-        super().__init__(case)
-
 
 class CaseBottom(SimpleZenObj):
     colour = color.white
@@ -274,35 +364,58 @@ class CaseBottom(SimpleZenObj):
     size = Size(CaseProperties.size.x, CaseProperties.size.y, CaseProperties.size.z - EPS)
     top_center = (size.x / 2, size.y / 2, size.z)
 
-    def __init__(self, device, battery):
+    features = FeatureGraph('case_bottom')
+
+    def __init__(self, device, battery, preview=False):
         """
         :type device: Device
         :type battery: Battery
+        :param preview: skip fillets and face unification
+        :type preview: bool
         """
-        case = thicksolid(
-            proto=box(size=self.size),
+        super().__init__(self.features.build(device, preview))
+
+    @features.feature('shell', params=(
+            'CaseBottom.size', 'CaseBottom.top_center', 'CaseProperties.width'
+    ))
+    def shell(case, device):
+        return thicksolid(
+            proto=box(size=CaseBottom.size),
             t=CaseProperties.width,
-            refs=[self.top_center]
+            refs=[CaseBottom.top_center]
         )
 
+    @features.feature('battery_wall', params=(
+            'CaseBottom.size', 'CaseProperties.battery_wall_width',
+            'CaseProperties.battery_wall_offset_x'
+    ))
+    def battery_wall(case, device):
         battery_wall = box(size=(
             CaseProperties.battery_wall_width,
-            self.size.y + EPS2,
-            self.size.z + EPS
+            CaseBottom.size.y + EPS2,
+            CaseBottom.size.z + EPS
         )).move(vector3(
             CaseProperties.battery_wall_offset_x, -EPS, -EPS
         ))
-        case = case + battery_wall
+        return case + battery_wall
 
+    @features.feature('pcb_bed', params=(
+            'CaseBottom.size', 'CaseProperties.battery_wall_offset_x'
+    ), parts=('pcb',))
+    def pcb_bed(case, device):
         pcb_bed = box(size=(
             CaseProperties.battery_wall_offset_x + EPS2,
-            self.size.y + EPS2,
+            CaseBottom.size.y + EPS2,
             device.pcb.bbox().zmin + EPS  # full contact with PCB, no gaps
         )).move(vector3(
             -EPS, -EPS, -EPS
         ))
-        case = case + pcb_bed
+        return case + pcb_bed
 
+    @features.feature('screw_black_mount', params=(
+            'CaseProperties.size', 'CaseProperties.screw_black_mount_width'
+    ), parts=('pcb',))
+    def screw_black_mount(case, device):
         screw_black_mount = box(size=(
             CaseProperties.screw_black_mount_width + EPS,
             CaseProperties.screw_black_mount_width + EPS,
@@ -312,10 +425,16 @@ class CaseBottom(SimpleZenObj):
             -EPS,
             -EPS
         ))
-        case = case + screw_black_mount
+        return case + screw_black_mount
 
-        case = unify(case)
+    @features.feature('unify', cosmetic=True)
+    def unify_faces(case, device):
+        return unify(case)
 
+    @features.feature('lever_hole', params=(
+            'Socket.room_size', 'CaseProperties.width', 'CaseProperties.socket_margin'
+    ), parts=('socket',))
+    def lever_hole(case, device):
         socket_bbox = device.socket.bbox().with_border(CaseProperties.socket_margin)
         lever_hole = box(size=(
             CaseProperties.width + EPS2,
@@ -327,23 +446,17 @@ class CaseBottom(SimpleZenObj):
             socket_bbox.offset.z + socket_bbox.size.z - Socket.room_size.z -
             CaseProperties.socket_margin
         ))
-        case = case - lever_hole
+        return case - lever_hole
 
-        contact_pads_bbox = device.contact_pads.bbox()  # type: BBox
-        contact_pads_bbox = contact_pads_bbox.with_border_x(CaseProperties.contact_pads_margin)
-        contact_pads_bbox = contact_pads_bbox.with_border_y(CaseProperties.contact_pads_margin)
-        contact_pads_bbox = contact_pads_bbox.with_border_z(EPS)
-        contact_pads_hole = box(size=(
-            contact_pads_bbox.size.x,
-            contact_pads_bbox.ymax + CaseProperties.width + EPS,
-            CaseProperties.size.z + CaseProperties.width - contact_pads_bbox.zmin
-        )).move(vector3(
-            contact_pads_bbox.offset.x,
-            -CaseProperties.width - EPS,
-            contact_pads_bbox.zmin
-        ))
-        case = case - contact_pads_hole
+    @features.feature('contact_pads_hole', params=(
+            'CaseProperties.size', 'CaseProperties.width', 'CaseProperties.contact_pads_margin',
+            'CaseProperties.pcb_margin', 'CaseProperties.default_margin',
+            'CaseProperties.smd_margin'
+    ), parts=('contact_pads', 'pcb'))
+    def contact_pads_hole(case, device):
+        case = case - _contact_pads_hole(device)
 
+        contact_pads_bbox = _contact_pads_bbox(device)
         contact_pads_hole = box(size=(
             contact_pads_bbox.size.x,
             contact_pads_bbox.size.y - CaseProperties.pcb_margin - CaseProperties.default_margin,
@@ -353,8 +466,12 @@ class CaseBottom(SimpleZenObj):
             contact_pads_bbox.offset.y + CaseProperties.pcb_margin + CaseProperties.default_margin,
             device.pcb.bbox().zmin - CaseProperties.smd_margin
         ))
-        case = case - contact_pads_hole
+        return case - contact_pads_hole
 
+    @features.feature('smd_hole', params=(
+            'CaseProperties.default_margin', 'CaseProperties.smd_margin'
+    ), parts=('power_terminals', 'surface_mount', 'lcd_mount', 'pcb'))
+    def smd_hole(case, device):
         power_terminals_bbox = device.power_terminals.bbox()  # type: BBox
         surface_mount_bbox = device.surface_mount.bbox()  # type: BBox
         lcd_mount_bbox = device.lcd_mount.bbox()  # type: BBox
@@ -391,24 +508,41 @@ class CaseBottom(SimpleZenObj):
             proto=polysegment(smd_hole_points, closed=True).fill(),
             vec=CaseProperties.smd_margin
         ).moveZ(device.pcb.bbox().zmin - CaseProperties.smd_margin)
-        case = case - smd_hole
+        return case - smd_hole
 
+    @features.feature('components_holes', params=(
+            'CaseProperties.default_margin',
+    ), parts=('quarts', 'socket_terminals', 'button_mount'))
+    def components_holes(case, device):
+        batch = BooleanBatch()
         for obj in [
             device.quarts,
             device.socket_terminals,
             device.button_mount,
         ]:
-            case = case - obj.bbox().with_border(CaseProperties.default_margin).to_zen_box()
-
+            batch.subtract(obj.bbox().with_border(CaseProperties.default_margin).to_zen_box())
+        return batch.apply(case)
+
+    @features.feature('lcd_lock_holes', params=(
+            'LcdLock1.radius', 'LcdLock1.height', 'LcdLock2.radius', 'LcdLock2.height',
+            'CaseProperties.default_margin'
+    ), parts=('lcd_lock1', 'lcd_lock2'))
+    def lcd_lock_holes(case, device):
+        batch = BooleanBatch()
         lock_bbox = device.lcd_lock1.bbox()  # type: BBox
-        case = case - (cylinder(r=LcdLock1.radius + CaseProperties.default_margin,
+        batch.subtract(cylinder(r=LcdLock1.radius + CaseProperties.default_margin,
                                 h=LcdLock1.height + 2 * CaseProperties.default_margin, center=True)
                        .move(lock_bbox.center_offset))
         lock_bbox = device.lcd_lock2.bbox()  # type: BBox
-        case = case - (cylinder(r=LcdLock2.radius + CaseProperties.default_margin,
+        batch.subtract(cylinder(r=LcdLock2.radius + CaseProperties.default_margin,
                                 h=LcdLock2.height + 2 * CaseProperties.default_margin, center=True)
                        .move(lock_bbox.center_offset))
+        return batch.apply(case)
 
+    @features.feature('lcd_wires_hole', params=(
+            'CaseProperties.default_margin', 'CaseProperties.smd_margin'
+    ), parts=('lcd_wires',))
+    def lcd_wires_hole(case, device):
         lcd_wires_bbox = device.lcd_wires.bbox()  # type: BBox
         lcd_wires_bbox = lcd_wires_bbox.with_border_x(CaseProperties.default_margin)
         lcd_wires_bbox = lcd_wires_bbox.with_border_y(CaseProperties.default_margin)
@@ -419,8 +553,14 @@ class CaseBottom(SimpleZenObj):
             lcd_wires_bbox.offset.x, lcd_wires_bbox.offset.y,
             lcd_wires_bbox.offset.z - CaseProperties.smd_margin
         ))
-        case = case - lcd_wires_hole
-
+        return case - lcd_wires_hole
+
+    @features.feature('battery_wires', params=(
+            'PowerTerminals.wires_radius', 'PowerTerminals.wires_offset',
+            'CaseProperties.size', 'CaseProperties.pcb_offset', 'CaseProperties.battery_offset',
+            'CaseProperties.default_margin'
+    ), parts=('power_terminals', 'pcb'))
+    def battery_wires(case, device):
         power_terminals_bbox = device.power_terminals.bbox()  # type: BBox
         power_terminals_bbox = power_terminals_bbox.with_border(CaseProperties.default_margin)
         battery_wires_hole = cylinder(
@@ -446,42 +586,59 @@ class CaseBottom(SimpleZenObj):
             CaseProperties.pcb_offset.y + PowerTerminals.wires_offset.y,
             0.0
         ))
-        case = case - battery_wires_channel
-
+        return case - battery_wires_channel
+
+    @features.feature('screw_mounts', params=(
+            'CaseScrews.screw_info_dict', 'CaseProperties.width',
+            'CaseProperties.screw_cap_margin', 'CaseProperties.screw_radius_margin',
+            'CaseProperties.case_mount_width', 'CaseProperties.case_mount_height'
+    ))
+    def screw_mounts(case, device):
+        batch = BooleanBatch()
         for info in CaseScrews.screw_info_dict.values():
             screw_hole_h = info.screw_offset.z + CaseProperties.width + EPS
-            screw_mount = cone(
+            batch.add(cone(
                 r1=(info.screw_class.cap_r + CaseProperties.screw_cap_margin * 2 +
                     CaseProperties.case_mount_width),
                 r2=(info.screw_class.cap_r + CaseProperties.screw_cap_margin +
                     CaseProperties.case_mount_width),
                 h=screw_hole_h + CaseProperties.case_mount_height - CaseProperties.width
-            ).move(info.screw_offset).moveZ(-screw_hole_h + CaseProperties.width)
-            case = case + screw_mount
+            ).move(info.screw_offset).moveZ(-screw_hole_h + CaseProperties.width))
 
-            screw_hole = cone(
+            batch.subtract(cone(
                 r1=info.screw_class.cap_r + CaseProperties.screw_cap_margin * 2,
                 r2=info.screw_class.cap_r + CaseProperties.screw_cap_margin,
                 h=screw_hole_h
-            ).move(info.screw_offset).moveZ(-screw_hole_h)
-            case = case - screw_hole
+            ).move(info.screw_offset).moveZ(-screw_hole_h))
 
-            screw_hole = cylinder(
+            batch.subtract(cylinder(
                 r=info.screw_class.radius + CaseProperties.screw_radius_margin,
                 h=CaseProperties.case_mount_height + EPS2
-            ).move(info.screw_offset).moveZ(-EPS)
-            case = case - screw_hole
-
-        case = unify(case)
-
-        case = fillet(case, r=CaseProperties.width / 2, refs=points([
+            ).move(info.screw_offset).moveZ(-EPS))
+        return batch.apply(case)
+
+    @features.feature('unify_screw_mounts', cosmetic=True)
+    def unify_screw_mounts(case, device):
+        return unify(case)
+
+    @features.feature('contact_pads_fillet', params=(
+            'CaseProperties.size', 'CaseProperties.width', 'CaseProperties.contact_pads_margin'
+    ), parts=('contact_pads',), cosmetic=True)
+    def contact_pads_fillet(case, device):
+        contact_pads_bbox = _contact_pads_bbox(device)
+        return fillet(case, r=CaseProperties.width / 2, refs=points([
             (contact_pads_bbox.center_offset.x, -CaseProperties.width, contact_pads_bbox.zmin),
             (contact_pads_bbox.xmin, -CaseProperties.width, contact_pads_bbox.zmin + 1),
             (contact_pads_bbox.xmax, -CaseProperties.width, contact_pads_bbox.zmin + 1),
         ]))
 
+    @features.feature('lever_fillet', params=(
+            'Socket.room_size', 'CaseProperties.size', 'CaseProperties.width',
+            'CaseProperties.socket_margin'
+    ), parts=('socket',), cosmetic=True)
+    def lever_fillet(case, device):
         socket_bbox = device.socket.bbox()  # type: BBox
-        case = fillet(case, r=1.4, refs=points([
+        return fillet(case, r=1.4, refs=points([
             (-CaseProperties.width, socket_bbox.ymin, CaseProperties.size.z - 1),
             (-CaseProperties.width,
              socket_bbox.ymin + Socket.room_size.y + CaseProperties.socket_margin,
@@ -491,7 +648,11 @@ class CaseBottom(SimpleZenObj):
              CaseProperties.size.z + CaseProperties.width - Socket.room_size.z),
         ]))
 
-        case = fillet(case, r=1.0, refs=points([
+    @features.feature('screw_mounts_fillet', params=(
+            'CaseScrews.screw_info_dict', 'CaseProperties.width'
+    ), cosmetic=True)
+    def screw_mounts_fillet(case, device):
+        return fillet(case, r=1.0, refs=points([
             (
                 info.screw_offset.x, info.screw_offset.y,
                 -CaseProperties.width - 1
@@ -499,7 +660,12 @@ class CaseBottom(SimpleZenObj):
             for info in CaseScrews.screw_info_dict.values()
         ]))
 
-        case = fillet(case, r=1.4, refs=points([
+    @features.feature('walls_fillet', params=(
+            'CaseProperties.size', 'CaseProperties.battery_wall_offset_x',
+            'CaseProperties.battery_wall_width', 'CaseProperties.screw_black_mount_width'
+    ), parts=('pcb',), cosmetic=True)
+    def walls_fillet(case, device):
+        return fillet(case, r=1.4, refs=points([
             (CaseProperties.battery_wall_offset_x + CaseProperties.battery_wall_width, 0, 5),
             (CaseProperties.battery_wall_offset_x + CaseProperties.battery_wall_width, 7, 5),
             (CaseProperties.battery_wall_offset_x + CaseProperties.battery_wall_width, 10, 5),
@@ -514,8 +680,6 @@ class CaseBottom(SimpleZenObj):
              CaseProperties.screw_black_mount_width / 2, device.pcb.bbox().zmax),
         ]))
 
-        super().__init__(case)
-
 
 class ScrewInfo(object):
     def __init__(self, screw_class, screw_offset):
@@ -546,8 +710,33 @@ class CaseScrews(CompoundZenObj):
     }  # type: dict[str, ScrewInfo]
 
     def __init__(self):
-        screw_dict = {
-            k: info.screw_class().transformed(move(info.screw_offset))
+        # Screws are used for display only, so they are built on first access
+        super().__init__(**{
+            k: Lazy(partial(self.build_screw, k, info),
+                    info.screw_class.analytic_bbox().moved(info.screw_offset))
             for k, info in self.screw_info_dict.items()
-        }
-        super().__init__(**screw_dict)
+        })
+
+    @staticmethod
+    def build_screw(name, info):
+        """
+        :type name: str
+        :type info: ScrewInfo
+        :rtype: SimpleZenObj
+        """
+        with stage(f'case_screws.{name}') as record:
+            screw = CaseScrews.screw(info.screw_class).transformed(Translation(info.screw_offset))
+            # The base shape has the same topology, the placement stays deferred
+            record.shape = screw.base_shape
+        return screw
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def screw(screw_class):
+        """
+        Screws of the same class share the geometry, only their placements differ.
+
+        :type screw_class: type[ScrewBase]
+        :rtype: ScrewBase
+        """
+        return screw_class()
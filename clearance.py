@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Clearance checks between device components and case parts.
+
+Surfaces of every shape are sampled as point clouds from a coarse tessellation. For every
+sample of a component the nearest sample of a case part is found with a KD-tree (if SciPy
+is installed) or a chunked brute force search with NumPy. The distance is signed by the
+normal of the case facet of the nearest sample, so samples inside a case wall give
+negative distances, i.e. interference.
+
+Components are checked against the margins the case is designed with (see
+`design_margins`), other components only for interference, unless margins are given.
+
+Pairs whose bounding boxes are farther apart than the required clearance are not sampled,
+such pairs are skipped by a bounding volume hierarchy over the component boxes.
+"""
+import headless  # noqa: F401, defers the viewer, must precede the first import of zencad
+
+import argparse
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+import case_model
+from api import BBox, BBoxBatch, BoxTree
+from export import face_meshes
+
+
+class SurfaceSamples(object):
+    """
+    Points sampled on a surface with the outward normals of their facets.
+
+    :type points: numpy.ndarray
+    :type normals: numpy.ndarray
+    """
+
+    def __init__(self, points, normals):
+        """
+        :param points: (N, 3) array
+        :type points: numpy.ndarray
+        :param normals: (N, 3) array of unit vectors
+        :type normals: numpy.ndarray
+        """
+        self.points = points
+        self.normals = normals
+        self.__tree = None
+
+    @staticmethod
+    def from_shape(shape, spacing):
+        """
+        :type shape: pyservoce.libservoce.Shape
+        :param spacing: maximal distance between neighbouring samples
+        :type spacing: float
+        :rtype: SurfaceSamples
+        """
+        triangles = []
+        for nodes, face_triangles in face_meshes(shape, spacing / 4):
+            if not face_triangles:
+                continue
+            coordinates = numpy.array([(p.x, p.y, p.z) for p in nodes])
+            triangles.append(coordinates[numpy.array(face_triangles)])
+        if not triangles:
+            return SurfaceSamples(numpy.empty((0, 3)), numpy.empty((0, 3)))
+        return _sample_triangles(numpy.concatenate(triangles), spacing)
+
+    def nearest(self, points):
+        """
+        Finds the nearest samples to `points`.
+
+        :param points: (M, 3) array
+        :type points: numpy.ndarray
+        :return: distances and indices of the nearest samples
+        :rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        if cKDTree is not None:
+            if self.__tree is None:
+                self.__tree = cKDTree(self.points)
+            return self.__tree.query(points)
+
+        # Distances of a chunk of points to all samples, bounded to about 64 MB
+        chunk = max(1, 2 ** 23 // max(1, len(self.points)))
+        distances = numpy.empty(len(points))
+        indices = numpy.empty(len(points), dtype=numpy.intp)
+        squared = (self.points ** 2).sum(axis=1)
+        for start in range(0, len(points), chunk):
+            p = points[start:start + chunk]
+            d = (p ** 2).sum(axis=1)[:, None] - 2 * p @ self.points.T + squared[None, :]
+            i = d.argmin(axis=1)
+            indices[start:start + chunk] = i
+            distances[start:start + chunk] = numpy.sqrt(
+                numpy.maximum(d[numpy.arange(len(p)), i], 0.0)
+            )
+        return distances, indices
+
+
+def _sample_triangles(triangles, spacing):
+    """
+    Samples triangles on barycentric grids dense enough for `spacing`.
+
+    :param triangles: (T, 3, 3) array of vertex coordinates
+    :type triangles: numpy.ndarray
+    :type spacing: float
+    :rtype: SurfaceSamples
+    """
+    a, b, c = triangles[:, 0], triangles[:, 1], triangles[:, 2]
+    normals = numpy.cross(b - a, c - a)
+    lengths = numpy.linalg.norm(normals, axis=1)
+    valid = lengths > 0
+    triangles, normals = triangles[valid], normals[valid] / lengths[valid, None]
+
+    edges = numpy.stack([
+        numpy.linalg.norm(triangles[:, 1] - triangles[:, 0], axis=1),
+        numpy.linalg.norm(triangles[:, 2] - triangles[:, 1], axis=1),
+        numpy.linalg.norm(triangles[:, 0] - triangles[:, 2], axis=1),
+    ], axis=1)
+    steps = numpy.maximum(1, numpy.ceil(edges.max(axis=1) / spacing)).astype(int)
+
+    points = []
+    point_normals = []
+    # Triangles needing the same grid are sampled at once
+    for n in numpy.unique(steps):
+        i, j = numpy.meshgrid(numpy.arange(n + 1), numpy.arange(n + 1), indexing='ij')
+        mask = i + j <= n
+        weights = numpy.stack([n - i[mask] - j[mask], i[mask], j[mask]], axis=1) / n
+        group = steps == n
+        points.append(numpy.einsum('kv,tvd->tkd', weights, triangles[group]).reshape(-1, 3))
+        point_normals.append(numpy.repeat(normals[group], len(weights), axis=0))
+    return SurfaceSamples(numpy.concatenate(points), numpy.concatenate(point_normals))
+
+
+class Clearance(object):
+    def __init__(self, component, part, distance, required, point):
+        """
+        :param component: dotted name of the device component
+        :type component: str
+        :param part: name of the case part
+        :type part: str
+        :param distance: minimal distance between surfaces, negative for interference
+        :type distance: float
+        :type required: float
+        :param point: sample of the component surface at the minimal distance
+        :type point: (float, float, float)
+        """
+        self.component = component
+        self.part = part
+        self.distance = distance
+        self.required = required
+        self.point = point
+
+    def to_dict(self):
+        """
+        :rtype: dict
+        """
+        return {
+            'component': self.component,
+            'part': self.part,
+            'distance': self.distance,
+            'required': self.required,
+            'point': self.point,
+        }
+
+    def __str__(self):
+        x, y, z = self.point
+        kind = 'interferes with' if self.distance < 0 else 'is too close to'
+        return (f'{self.component} {kind} {self.part}: {self.distance:.3f} mm, required '
+                f'{self.required:.3f} mm, at ({x:.2f}, {y:.2f}, {z:.2f})')
+
+
+def _clearance(component, samples, part, part_samples, required):
+    """
+    :type component: str
+    :type samples: SurfaceSamples
+    :type part: str
+    :type part_samples: SurfaceSamples
+    :type required: float
+    :rtype: Clearance
+    """
+    distances, indices = part_samples.nearest(samples.points)
+    offsets = samples.points - part_samples.points[indices]
+    inside = (offsets * part_samples.normals[indices]).sum(axis=1) < 0
+    signed = numpy.where(inside, -distances, distances)
+    i = int(signed.argmin())
+    return Clearance(component, part, float(signed[i]), required,
+                     tuple(float(v) for v in samples.points[i]))
+
+
+def design_margins():
+    """
+    Returns the margins of `CaseProperties` by the components whose holes are grown by them
+    on every side. Other margins apply to some sides only, e.g. the PCB lies on the case.
+
+    :return: required clearances by dotted component names
+    :rtype: dict[str, float]
+    """
+    properties = case_model.CaseProperties
+    margins = {
+        'device.socket': properties.socket_margin,
+        'device.button_cap': properties.button_cap_margin,
+        'device.lcd_screen': properties.screen_margin,
+    }
+    for name in ('quarts', 'socket_terminals', 'button_mount', 'lcd_lock1', 'lcd_lock2',
+                 'power_terminals'):
+        margins[f'device.{name}'] = properties.default_margin
+    return margins
+
+
+def check_clearances(components, parts, margins=None, default_margin=0.0, spacing=0.2,
+                     jobs=None):
+    """
+    Finds pairs of device components and case parts closer than the required clearance.
+
+    :param components: shapes of device components by dotted names
+    :type components: dict[str, pyservoce.libservoce.Shape]
+    :param parts: shapes of case parts by names
+    :type parts: dict[str, pyservoce.libservoce.Shape]
+    :param margins: required clearances by component names, they replace the ones of
+                    `design_margins()`
+    :type margins: None | dict[str, float]
+    :param default_margin: required clearance of other components
+    :type default_margin: float
+    :param spacing: distance between surface samples, distances are found with this
+                    accuracy, so smaller violations are tolerated
+    :type spacing: float
+    :param jobs: number of threads comparing point clouds
+    :type jobs: None | int
+    :return: violations sorted by distance
+    :rtype: list[Clearance]
+    """
+    margins = dict(design_margins(), **(margins or {}))
+    shapes = dict(components, **parts)
+    required = [margins.get(component, default_margin) for component in components]
+    names = list(components)
+    component_boxes = BBoxBatch.from_boxes(BBox.from_zen_shape(s) for s in components.values())
+    # Boxes grown by the required clearance include all points closer than it
+    index = BoxTree(list(range(len(names))),
+                    component_boxes.with_border(numpy.add(required, spacing)))
+    pairs = [
+        (names[i], part, required[i])
+        for part, shape in parts.items()
+        for i in sorted(index.query(BBox.from_zen_shape(shape)))
+    ]
+
+    # The kernel is sampled sequentially, NumPy and SciPy release the GIL for the queries
+    samples = {}
+    for component, part, _ in pairs:
+        for name in (component, part):
+            if name not in samples:
+                samples[name] = SurfaceSamples.from_shape(shapes[name], spacing)
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        results = executor.map(
+            lambda pair: _clearance(pair[0], samples[pair[0]], pair[1], samples[pair[1]],
+                                    pair[2]),
+            [pair for pair in pairs if len(samples[pair[0]].points) and
+             len(samples[pair[1]].points)]
+        )
+        violations = [c for c in results if c.distance < c.required - spacing]
+    return sorted(violations, key=lambda c: c.distance - c.required)
+
+
+def component_shapes(device, battery):
+    """
+    :type device: CompoundZenObj
+    :type battery: SimpleZenObj
+    :return: shapes of device components and the battery by dotted names
+    :rtype: dict[str, pyservoce.libservoce.Shape]
+    """
+    components = {}
+    for name, obj in (('device', device), ('battery', battery)):
+        for leaf, shape, _ in obj.leaves(name):
+            components[leaf] = shape
+    return components
+
+
+def model_clearances(all_objects, margins=None, default_margin=0.0, spacing=0.2,
+                     jobs=None):
+    """
+    Checks clearances between the internals and the case parts of a model built by
+    `main.create_model`.
+
+    :type all_objects: CompoundZenObj
+    :rtype: list[Clearance]
+    """
+    internals = all_objects.internals
+    components = component_shapes(internals['device'], internals['battery'])
+    parts = {name: all_objects.case[name].shape for name in ('top', 'bottom')}
+    return check_clearances(components, parts, margins, default_margin, spacing, jobs)
+
+
+def parse_margins(values):
+    """
+    :param values: `<component>=<mm>` strings
+    :type values: list[str]
+    :rtype: dict[str, float]
+    """
+    margins = {}
+    for value in values:
+        name, _, margin = value.partition('=')
+        margins[name] = float(margin)
+    return margins
+
+
+def main():
+    from main import create_model
+
+    parser = argparse.ArgumentParser(
+        description='Check clearances between device components and case parts')
+    parser.add_argument('--spacing', type=float, default=0.2,
+                        help='distance between surface samples in mm')
+    parser.add_argument('--default-margin', type=float, default=0.0,
+                        help='required clearance of components without a design margin '
+                             'or --margin')
+    parser.add_argument('--margin', action='append', default=[],
+                        metavar='COMPONENT=MM',
+                        help='required clearance of a component, e.g. device.button_cap=0.3')
+    parser.add_argument('--jobs', type=int, help='number of threads comparing point clouds')
+    parser.add_argument('--preview', action='store_true',
+                        help='check case parts built without cosmetic features')
+    args = parser.parse_args()
+
+    violations = model_clearances(create_model(preview=args.preview),
+                                  parse_margins(args.margin), args.default_margin,
+                                  args.spacing, args.jobs)
+    for violation in violations:
+        print(violation)
+    print(f'{len(violations)} violations')
+    sys.exit(1 if violations else 0)
+
+
+if __name__ == '__main__':
+    main()
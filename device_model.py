@@ -1,12 +1,41 @@
 from zencad import *
 
-from api import Size, SimpleZenObj, CompoundZenObj
+from functools import partial
+
+from api import Size, SimpleZenObj, CompoundZenObj, Lazy, BBox
 from config import EPS, EPS2, LEVER_ANGLE
+from profiler import stage
 
 # Fix the incorrectly named color
 color.cyan = color.cian
 
 
+def _cylinder_bbox(radius, height, offset):
+    """
+    :param offset: center of the cylinder base
+    :type offset: pyservoce.vector3
+    :rtype: BBox
+    """
+    return BBox(
+        offset.x - radius, offset.x + radius,
+        offset.y - radius, offset.y + radius,
+        offset.z, offset.z + height
+    )
+
+
+def _prism_bbox(points, height):
+    """
+    :param points: base polygon in the XY plane
+    :type points: list[pyservoce.point3]
+    :rtype: BBox
+    """
+    return BBox(
+        min(p.x for p in points), max(p.x for p in points),
+        min(p.y for p in points), max(p.y for p in points),
+        0.0, height
+    )
+
+
 class Pcb(SimpleZenObj):
     colour = color.yellow
 
@@ -28,6 +57,10 @@ class Pcb(SimpleZenObj):
 
         super().__init__(pcb)
 
+    @classmethod
+    def analytic_bbox(cls):
+        return BBox.from_size(cls.size)
+
 
 class Lcd(SimpleZenObj):
     colour = color(0.0, 0.4, 0.0)
@@ -43,6 +76,10 @@ class Lcd(SimpleZenObj):
         lcd = box(size=self.size).move(self.offset)
         super().__init__(lcd)
 
+    @classmethod
+    def analytic_bbox(cls):
+        return BBox.from_size(cls.size, cls.offset)
+
 
 class LcdScreen(SimpleZenObj):
     colour = color.green
@@ -58,6 +95,10 @@ class LcdScreen(SimpleZenObj):
         lcd = box(size=self.size).move(self.offset)
         super().__init__(lcd)
 
+    @classmethod
+    def analytic_bbox(cls):
+        return BBox.from_size(cls.size, cls.offset)
+
 
 class LcdLight(SimpleZenObj):
     colour = color.white
@@ -83,6 +124,10 @@ class LcdLight(SimpleZenObj):
         light = light.move(self.offset)
         super().__init__(light)
 
+    @classmethod
+    def analytic_bbox(cls):
+        return _prism_bbox(cls.points, cls.width).moved(cls.offset)
+
 
 class LcdWires(SimpleZenObj):
     colour = color.mech
@@ -94,6 +139,10 @@ class LcdWires(SimpleZenObj):
         wires = box(size=self.size).move(self.offset)
         super().__init__(wires)
 
+    @classmethod
+    def analytic_bbox(cls):
+        return BBox.from_size(cls.size, cls.offset)
+
 
 class LcdMount(SimpleZenObj):
     colour = color.mech
@@ -105,6 +154,10 @@ class LcdMount(SimpleZenObj):
         mount = box(size=self.size).move(self.offset)
         super().__init__(mount)
 
+    @classmethod
+    def analytic_bbox(cls):
+        return BBox.from_size(cls.size, cls.offset)
+
 
 class LcdLock1(SimpleZenObj):
     colour = color.mech
@@ -121,6 +174,10 @@ class LcdLock1(SimpleZenObj):
         lock = cylinder(r=self.radius, h=self.height).move(self.offset)
         super().__init__(lock)
 
+    @classmethod
+    def analytic_bbox(cls):
+        return _cylinder_bbox(cls.radius, cls.height, cls.offset)
+
 
 class LcdLock2(SimpleZenObj):
     colour = color.mech
@@ -133,6 +190,10 @@ class LcdLock2(SimpleZenObj):
         lock = cylinder(r=self.radius, h=self.height).move(self.offset)
         super().__init__(lock)
 
+    @classmethod
+    def analytic_bbox(cls):
+        return _cylinder_bbox(cls.radius, cls.height, cls.offset)
+
 
 class Socket(SimpleZenObj):
     colour = color.cyan
@@ -149,6 +210,10 @@ class Socket(SimpleZenObj):
         socket = socket.move(self.offset)
         super().__init__(socket)
 
+    @classmethod
+    def analytic_bbox(cls):
+        return BBox.from_size(cls.size, cls.offset)
+
 
 class SocketLever(SimpleZenObj):
     colour = color.mech
@@ -193,6 +258,10 @@ class SocketTerminals(SimpleZenObj):
         terminals = box(self.size).move(self.offset)
         super().__init__(terminals)
 
+    @classmethod
+    def analytic_bbox(cls):
+        return BBox.from_size(cls.size, cls.offset)
+
 
 class Button(SimpleZenObj):
     colour = color(0.2, 0.2, 0.2)
@@ -208,6 +277,10 @@ class Button(SimpleZenObj):
         button = box(size=self.size).move(self.offset)
         super().__init__(button)
 
+    @classmethod
+    def analytic_bbox(cls):
+        return BBox.from_size(cls.size, cls.offset)
+
 
 class ButtonCap(SimpleZenObj):
     colour = color.blue
@@ -236,6 +309,14 @@ class ButtonCap(SimpleZenObj):
         cap = cap.move(self.offset)
         super().__init__(cap)
 
+    @classmethod
+    def analytic_bbox(cls):
+        return _cylinder_bbox(
+            max(cls.radius, cls.trim_radius, cls.leg_radius),
+            cls.leg_height + cls.trim_height + cls.height,
+            cls.offset
+        )
+
 
 class ButtonMount(SimpleZenObj):
     colour = color.mech
@@ -247,6 +328,10 @@ class ButtonMount(SimpleZenObj):
         mount = box(self.size).move(self.offset)
         super().__init__(mount)
 
+    @classmethod
+    def analytic_bbox(cls):
+        return BBox.from_size(cls.size, cls.offset)
+
 
 class ContactPads(SimpleZenObj):
     colour = color.mech
@@ -258,6 +343,10 @@ class ContactPads(SimpleZenObj):
         pads = box(self.size).move(self.offset)
         super().__init__(pads)
 
+    @classmethod
+    def analytic_bbox(cls):
+        return BBox.from_size(cls.size, cls.offset)
+
 
 class Quartz(SimpleZenObj):
     colour = color.mech
@@ -269,6 +358,10 @@ class Quartz(SimpleZenObj):
         quartz = box(size=self.size).move(self.offset)
         super().__init__(quartz)
 
+    @classmethod
+    def analytic_bbox(cls):
+        return BBox.from_size(cls.size, cls.offset)
+
 
 class PowerTerminals(SimpleZenObj):
     colour = color.mech
@@ -291,6 +384,11 @@ class PowerTerminals(SimpleZenObj):
         )
         super().__init__(terminals)
 
+    @classmethod
+    def analytic_bbox(cls):
+        return (BBox.from_size(cls.size, cls.offset) +
+                _cylinder_bbox(cls.wires_radius, cls.wires_height, cls.wires_offset))
+
 
 class SurfaceMount(SimpleZenObj):
     colour = color.mech
@@ -310,6 +408,10 @@ class SurfaceMount(SimpleZenObj):
         mount = mount.moveZ(-self.width)
         super().__init__(mount)
 
+    @classmethod
+    def analytic_bbox(cls):
+        return _prism_bbox(cls.points, cls.width).moved(vector3(0.0, 0.0, -cls.width))
+
 
 class Battery(SimpleZenObj):
     colour = color.mech
@@ -320,30 +422,52 @@ class Battery(SimpleZenObj):
         battery = box(self.size)
         super().__init__(battery)
 
+    @classmethod
+    def analytic_bbox(cls):
+        return BBox.from_size(cls.size)
+
 
 class Device(CompoundZenObj):
+    components = {
+        'pcb': Pcb,
+        'lcd': Lcd,
+        'lcd_screen': LcdScreen,
+        'lcd_light': LcdLight,
+        'lcd_wires': LcdWires,
+        'lcd_mount': LcdMount,
+        'lcd_lock1': LcdLock1,
+        'lcd_lock2': LcdLock2,
+        'socket': Socket,
+        'socket_lever': SocketLever,
+        'socket_lever_cap': SocketLevelCap,
+        'socket_terminals': SocketTerminals,
+        'button': Button,
+        'button_cap': ButtonCap,
+        'button_mount': ButtonMount,
+        'contact_pads': ContactPads,
+        'quarts': Quartz,
+        'power_terminals': PowerTerminals,
+        'surface_mount': SurfaceMount,
+    }  # type: dict[str, type[SimpleZenObj]]
+
     def __init__(self):
-        super().__init__(
-            pcb=Pcb(),
-            lcd=Lcd(),
-            lcd_screen=LcdScreen(),
-            lcd_light=LcdLight(),
-            lcd_wires=LcdWires(),
-            lcd_mount=LcdMount(),
-            lcd_lock1=LcdLock1(),
-            lcd_lock2=LcdLock2(),
-            socket=Socket(),
-            socket_lever=SocketLever(),
-            socket_lever_cap=SocketLevelCap(),
-            socket_terminals=SocketTerminals(),
-            button=Button(),
-            button_cap=ButtonCap(),
-            button_mount=ButtonMount(),
-            contact_pads=ContactPads(),
-            quarts=Quartz(),
-            power_terminals=PowerTerminals(),
-            surface_mount=SurfaceMount()
-        )
+        # Components are built on first access, e.g. export never builds display-only parts
+        super().__init__(**{
+            name: Lazy(partial(self.build_component, name, cls), cls.analytic_bbox())
+            for name, cls in self.components.items()
+        })
+
+    @staticmethod
+    def build_component(name, cls):
+        """
+        :type name: str
+        :type cls: type[SimpleZenObj]
+        :rtype: SimpleZenObj
+        """
+        with stage(f'device.{name}') as record:
+            component = cls()
+            record.shape = component.shape
+        return component
 
 
 class ScrewBase(SimpleZenObj):
@@ -359,6 +483,12 @@ class ScrewBase(SimpleZenObj):
         shape = shape.moveZ(self.length)
         super().__init__(shape)
 
+    @classmethod
+    def analytic_bbox(cls):
+        # Turned upside down, the cap is below zero and the thread end is at `length`
+        r = max(cls.radius, cls.cap_r)
+        return BBox(-r, r, -r, r, -cls.cap_h, cls.length)
+
 
 class ScrewSilver(ScrewBase):
     colour = color.mech
@@ -0,0 +1,631 @@
+"""
+Export of shapes to mesh and CAD files.
+
+The format of every output file is chosen by its extension:
+
+* `.stl` -- binary STL;
+* `.stl.gz`, `.stl.zst` -- compressed binary STL, zstd requires the `zstandard` package;
+* `.3mf` -- 3MF with part colours, `write_3mf` bundles several parts in a single file;
+* `.brep` -- OpenCascade B-rep for CAD tools.
+
+A shape written to several mesh formats is tessellated only once. Meshes can be saved in
+a compact binary format (`Mesh.write`), so later runs reuse them.
+"""
+import gzip
+import math
+import os
+import struct
+import sys
+import time
+import zipfile
+from array import array
+from collections import namedtuple
+from xml.sax.saxutils import quoteattr
+
+import evalcache
+import pyservoce
+from zencad import to_brep, to_stl
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+_STL_HEADER = struct.Struct('<80sI')
+_STL_TRIANGLE = struct.Struct('<12fH')
+
+FORMATS = ('.stl', '.stl.gz', '.stl.zst', '.3mf', '.brep')
+
+# Magic number and version of the binary mesh format, followed by node and triangle counts
+_MESH_HEADER = struct.Struct('<8sII')
+_MESH_MAGIC = b'LCRMESH1'
+
+Node = namedtuple('Node', ['x', 'y', 'z'])
+
+
+class ExportStats(object):
+    def __init__(self, triangles, size, seconds):
+        """
+        :type triangles: int
+        :param size: file size in bytes
+        :type size: int
+        :type seconds: float
+        """
+        self.triangles = triangles
+        self.size = size
+        self.seconds = seconds
+
+    def __str__(self):
+        rate = self.triangles / self.seconds if self.seconds else float('inf')
+        return (f'{self.triangles} triangles, {self.size / 1024 / 1024:.1f} MB '
+                f'in {self.seconds:.2f} s ({rate:.0f} triangles/s)')
+
+
+def _normal(a, b, c):
+    ux, uy, uz = b.x - a.x, b.y - a.y, b.z - a.z
+    vx, vy, vz = c.x - a.x, c.y - a.y, c.z - a.z
+    nx, ny, nz = uy * vz - uz * vy, uz * vx - ux * vz, ux * vy - uy * vx
+    length = (nx * nx + ny * ny + nz * nz) ** 0.5 or 1.0
+    return nx / length, ny / length, nz / length
+
+
+def export_format(path):
+    """
+    :return: one of `FORMATS`
+    :rtype: str
+    """
+    for fmt in FORMATS:
+        if path.endswith(fmt):
+            return fmt
+    raise ValueError(f'Unsupported export format of {path}, expected one of {FORMATS}')
+
+
+def _open(path):
+    """
+    Opens a file for binary writing, compressed according to its extension.
+
+    :type path: str
+    """
+    if path.endswith('.gz'):
+        return gzip.open(path, 'wb')
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError('Writing .zst files requires the zstandard package')
+        return zstandard.ZstdCompressor().stream_writer(open(path, 'wb'))
+    return open(path, 'wb')
+
+
+class StlStream(object):
+    """
+    Binary STL file written through a fixed-size buffer. Unless the triangle count is
+    known upfront, it is patched in the header when the stream is closed, which is only
+    possible for uncompressed files.
+    """
+
+    def __init__(self, path, buffer_triangles=4096, triangles=None):
+        """
+        :param path: `.stl`, `.stl.gz` or `.stl.zst` file
+        :type path: str
+        :param buffer_triangles: number of triangles buffered before writing to the file
+        :type buffer_triangles: int
+        :param triangles: total number of triangles, if known
+        :type triangles: None | int
+        """
+        if triangles is None and export_format(path) != '.stl':
+            raise ValueError(f'Triangle count of compressed {path} must be known upfront')
+        self.triangles = 0
+        self.size = None
+        self.__path = path
+        self.__count = triangles
+        self.__file = _open(path)
+        self.__file.write(_STL_HEADER.pack(b'binary STL', triangles or 0))
+        self.__buffer = bytearray(_STL_TRIANGLE.size * buffer_triangles)
+        self.__buffered = 0
+
+    def write_mesh(self, nodes, triangles):
+        """
+        :type nodes: list[pyservoce.point3] | list[Node]
+        :param triangles: triples of node indices
+        :type triangles: list[(int, int, int)]
+        """
+        for i, j, k in triangles:
+            a, b, c = nodes[i], nodes[j], nodes[k]
+            _STL_TRIANGLE.pack_into(
+                self.__buffer, self.__buffered * _STL_TRIANGLE.size,
+                *_normal(a, b, c), a.x, a.y, a.z, b.x, b.y, b.z, c.x, c.y, c.z, 0
+            )
+            self.__buffered += 1
+            if self.__buffered * _STL_TRIANGLE.size == len(self.__buffer):
+                self.__flush()
+        self.triangles += len(triangles)
+
+    def __flush(self):
+        self.__file.write(memoryview(self.__buffer)[:self.__buffered * _STL_TRIANGLE.size])
+        self.__buffered = 0
+
+    def close(self):
+        """
+        Flushes the buffer, writes the triangle count and sets `size` to the file size.
+        """
+        self.__flush()
+        if self.__count is None:
+            self.__file.seek(0)
+            self.__file.write(_STL_HEADER.pack(b'binary STL', self.triangles))
+        self.__file.close()
+        self.size = os.path.getsize(self.__path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def face_meshes(shape, delta):
+    """
+    Tessellates `shape` face by face.
+
+    :type shape: pyservoce.libservoce.Shape
+    :type delta: float
+    :return: nodes and triangles of every face
+    :rtype: typing.Iterator[(list[pyservoce.point3], list[(int, int, int)])]
+    """
+    for face in evalcache.unlazy_if_need(shape).faces():
+        # The kernel call bypasses ZenCad's evaluation cache, which would keep every mesh
+        yield pyservoce.triangulation(face, delta)
+
+
+def stream_stl(meshes, path, buffer_triangles=4096):
+    """
+    Streams face meshes to a binary STL file, so only the mesh of a single face is kept
+    in memory.
+
+    :type meshes: typing.Iterable[(list[pyservoce.point3], list[(int, int, int)])]
+    :type path: str
+    :type buffer_triangles: int
+    :rtype: ExportStats
+    """
+    start = time.perf_counter()
+    with StlStream(path, buffer_triangles) as stream:
+        for nodes, triangles in meshes:
+            stream.write_mesh(nodes, triangles)
+    return ExportStats(stream.triangles, stream.size, time.perf_counter() - start)
+
+
+def write_stl(shape, path, delta, buffer_triangles=4096):
+    """
+    Tessellates `shape` face by face and streams triangles to a binary STL file.
+
+    :type shape: pyservoce.libservoce.Shape
+    :type path: str
+    :type delta: float
+    :type buffer_triangles: int
+    :rtype: ExportStats
+    """
+    return stream_stl(face_meshes(shape, delta), path, buffer_triangles)
+
+
+def _face_radius(nodes, triangles):
+    """
+    Estimates the curvature radius of a face from a coarse mesh of it.
+
+    :type nodes: list[pyservoce.point3]
+    :type triangles: list[(int, int, int)]
+    :return: `None` for planar faces
+    :rtype: None | float
+    """
+    normals = [_normal(nodes[i], nodes[j], nodes[k]) for i, j, k in triangles]
+    if not normals:
+        return None
+    nx, ny, nz = normals[0]
+    turn = max(math.acos(max(-1.0, min(1.0, nx * x + ny * y + nz * z))) for x, y, z in normals)
+    if turn < 1e-3:
+        return None
+
+    xs = [p.x for p in nodes]
+    ys = [p.y for p in nodes]
+    zs = [p.z for p in nodes]
+    size = math.sqrt((max(xs) - min(xs)) ** 2 + (max(ys) - min(ys)) ** 2 +
+                     (max(zs) - min(zs)) ** 2)
+    return size / turn
+
+
+def adaptive_face_meshes(shape, planar_delta, curved_delta, angular_tolerance, max_delta=None):
+    """
+    Tessellates `shape` face by face, choosing the chordal deviation of every face from
+    its curvature: planar faces use `planar_delta`, curved ones the deviation which keeps
+    facets within `angular_tolerance`, limited to the range from `curved_delta` to
+    `max_delta`.
+
+    Every face is meshed once at the coarsest deviation to estimate its curvature, and
+    that mesh is kept unless the face needs a finer one. Faces are meshed with their own
+    deviation, so a coarse face doesn't inherit the discretization of an edge shared with
+    a fine one.
+
+    :type shape: pyservoce.libservoce.Shape
+    :type planar_delta: float
+    :param curved_delta: minimal chordal deviation of curved faces
+    :type curved_delta: float
+    :param angular_tolerance: maximal angle between normals of adjacent facets in radians
+    :type angular_tolerance: float
+    :param max_delta: maximal chordal deviation of curved faces, `planar_delta` by default
+    :type max_delta: None | float
+    :rtype: typing.Iterator[(list[pyservoce.point3], list[(int, int, int)])]
+    """
+    if max_delta is None:
+        max_delta = planar_delta
+    coarse_delta = max(planar_delta, max_delta)
+    for face in evalcache.unlazy_if_need(shape).faces():
+        mesh = pyservoce.triangulation(face, coarse_delta)
+        radius = _face_radius(*mesh)
+        if radius is None:
+            delta = planar_delta
+        else:
+            # Chordal deviation of an arc of `radius` split into `angular_tolerance` steps
+            delta = max(curved_delta, min(max_delta, radius * angular_tolerance ** 2 / 8))
+        if delta < coarse_delta:
+            mesh = pyservoce.triangulation(face, delta)
+        yield mesh
+
+
+def write_adaptive_stl(shape, path, planar_delta, curved_delta, angular_tolerance,
+                       max_delta=None, buffer_triangles=4096):
+    """
+    Streams a binary STL file tessellated by `adaptive_face_meshes`.
+
+    :type shape: pyservoce.libservoce.Shape
+    :type path: str
+    :type planar_delta: float
+    :type curved_delta: float
+    :type angular_tolerance: float
+    :type max_delta: None | float
+    :type buffer_triangles: int
+    :rtype: ExportStats
+    """
+    meshes = adaptive_face_meshes(shape, planar_delta, curved_delta, angular_tolerance,
+                                  max_delta)
+    return stream_stl(meshes, path, buffer_triangles)
+
+
+class Mesh(object):
+    """
+    Tessellation of a shape kept in memory, so it can be written to several files. Nodes
+    on edges shared by adjacent faces are merged.
+
+    :type nodes: list[Node]
+    :type triangles: list[(int, int, int)]
+    """
+
+    def __init__(self, meshes):
+        """
+        :param meshes: nodes and triangles of every face
+        :type meshes: typing.Iterable[(list[pyservoce.point3], list[(int, int, int)])]
+        """
+        self.nodes = []
+        self.triangles = []
+        indices = {}
+        for nodes, triangles in meshes:
+            face_indices = []
+            for p in nodes:
+                node = Node(round(p.x, 6), round(p.y, 6), round(p.z, 6))
+                index = indices.get(node)
+                if index is None:
+                    index = indices[node] = len(self.nodes)
+                    self.nodes.append(node)
+                face_indices.append(index)
+            self.triangles.extend(
+                (face_indices[i], face_indices[j], face_indices[k]) for i, j, k in triangles
+            )
+
+    def write_stl(self, path):
+        """
+        :param path: `.stl`, `.stl.gz` or `.stl.zst` file
+        :type path: str
+        :return: file size in bytes
+        :rtype: int
+        """
+        with StlStream(path, triangles=len(self.triangles)) as stream:
+            stream.write_mesh(self.nodes, self.triangles)
+        return stream.size
+
+    def write(self, path):
+        """
+        Writes the mesh in the binary mesh format: the header, then little endian float64
+        node coordinates and uint32 node indices of triangles.
+
+        :type path: str
+        :return: file size in bytes
+        :rtype: int
+        """
+        nodes = array('d', (c for node in self.nodes for c in node))
+        triangles = array('I', (i for triangle in self.triangles for i in triangle))
+        if sys.byteorder == 'big':
+            nodes.byteswap()
+            triangles.byteswap()
+        with open(path, 'wb') as f:
+            f.write(_MESH_HEADER.pack(_MESH_MAGIC, len(self.nodes), len(self.triangles)))
+            nodes.tofile(f)
+            triangles.tofile(f)
+        return os.path.getsize(path)
+
+    @staticmethod
+    def read(path):
+        """
+        :param path: file written by `Mesh.write`
+        :type path: str
+        :rtype: Mesh
+        """
+        with open(path, 'rb') as f:
+            magic, node_count, triangle_count = _MESH_HEADER.unpack(f.read(_MESH_HEADER.size))
+            if magic != _MESH_MAGIC:
+                raise ValueError(f'{path} is not a mesh file')
+            nodes = array('d')
+            nodes.fromfile(f, node_count * 3)
+            triangles = array('I')
+            triangles.fromfile(f, triangle_count * 3)
+        if sys.byteorder == 'big':
+            nodes.byteswap()
+            triangles.byteswap()
+
+        mesh = Mesh(())
+        mesh.nodes = [Node(*nodes[i:i + 3]) for i in range(0, len(nodes), 3)]
+        mesh.triangles = list(zip(triangles[0::3], triangles[1::3], triangles[2::3]))
+        return mesh
+
+
+def hex_colour(colour):
+    """
+    :type colour: None | Color
+    :rtype: str
+    """
+    if colour is None:
+        return '#808080'
+    return '#' + ''.join(f'{round(c * 255):02X}' for c in (colour.r, colour.g, colour.b))
+
+
+_3MF_CONTENT_TYPES = '''<?xml version="1.0" encoding="UTF-8"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+ <Default Extension="rels"
+  ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+ <Default Extension="model"
+  ContentType="application/vnd.ms-package.3dmanufacturing-3dmodel+xml"/>
+</Types>
+'''
+
+_3MF_RELATIONSHIPS = '''<?xml version="1.0" encoding="UTF-8"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+ <Relationship Id="rel0" Target="/3D/3dmodel.model"
+  Type="http://schemas.microsoft.com/3dmanufacturing/2013/01/3dmodel"/>
+</Relationships>
+'''
+
+
+def _3mf_model(parts, items=None):
+    """
+    :type parts: list[(str, Mesh, None | Color)]
+    :param items: indices of parts and their 3MF transformation matrices, every part is
+                  placed once as is if `None`
+    :type items: None | list[(int, tuple[float])]
+    :return: chunks of the 3MF model XML
+    :rtype: typing.Iterator[str]
+    """
+    yield ('<?xml version="1.0" encoding="UTF-8"?>\n'
+           '<model unit="millimeter" '
+           'xmlns="http://schemas.microsoft.com/3dmanufacturing/core/2015/02">\n'
+           ' <resources>\n  <basematerials id="1">\n')
+    for name, _, colour in parts:
+        yield f'   <base name={quoteattr(name)} displaycolor="{hex_colour(colour)}"/>\n'
+    yield '  </basematerials>\n'
+
+    for index, (name, mesh, _) in enumerate(parts):
+        yield (f'  <object id="{index + 2}" name={quoteattr(name)} type="model" pid="1" '
+               f'pindex="{index}">\n   <mesh>\n    <vertices>\n')
+        for n in mesh.nodes:
+            yield f'     <vertex x="{n.x}" y="{n.y}" z="{n.z}"/>\n'
+        yield '    </vertices>\n    <triangles>\n'
+        for i, j, k in mesh.triangles:
+            yield f'     <triangle v1="{i}" v2="{j}" v3="{k}"/>\n'
+        yield '    </triangles>\n   </mesh>\n  </object>\n'
+
+    yield ' </resources>\n <build>\n'
+    if items is None:
+        for index in range(len(parts)):
+            yield f'  <item objectid="{index + 2}"/>\n'
+    else:
+        for index, matrix in items:
+            transform = ' '.join(f'{v:.6g}' for v in matrix)
+            yield f'  <item objectid="{index + 2}" transform="{transform}"/>\n'
+    yield ' </build>\n</model>\n'
+
+
+def write_3mf(parts, path, items=None):
+    """
+    Writes several parts with their colours to a single 3MF file.
+
+    :param parts: name, mesh and colour of every part
+    :type parts: list[(str, Mesh, None | Color)]
+    :type path: str
+    :param items: placed copies of parts, indices of parts and 3MF transformation matrices
+                  (12 numbers, the last three are the translation), every part is placed
+                  once as is if `None`
+    :type items: None | list[(int, tuple[float])]
+    :return: file size in bytes
+    :rtype: int
+    """
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', _3MF_CONTENT_TYPES)
+        archive.writestr('_rels/.rels', _3MF_RELATIONSHIPS)
+        with archive.open('3D/3dmodel.model', 'w') as f:
+            for chunk in _3mf_model(parts, items):
+                f.write(chunk.encode())
+    return os.path.getsize(path)
+
+
+class StlExporter(object):
+    def __init__(self, delta, streaming=False):
+        """
+        :param delta: chordal deviation of the tessellation
+        :type delta: float
+        :param streaming: write binary STL face by face with bounded memory
+        :type streaming: bool
+        """
+        self.delta = delta
+        self.streaming = streaming
+
+    @property
+    def tag(self):
+        """
+        :return: identifier of the tessellation settings, used in cache keys of meshes
+        :rtype: str
+        """
+        return repr(self.delta)
+
+    @property
+    def export_tag(self):
+        """
+        :return: identifier of the export settings, used in cache keys of exported files,
+                 streamed files are binary unlike the ones of ZenCad
+        :rtype: str
+        """
+        return f'{self.tag}-stream' if self.streaming else self.tag
+
+    def face_meshes(self, shape):
+        """
+        :type shape: pyservoce.libservoce.Shape
+        :rtype: typing.Iterator[(list[pyservoce.point3], list[(int, int, int)])]
+        """
+        return face_meshes(shape, self.delta)
+
+    def export(self, shape, path):
+        """
+        :type shape: pyservoce.libservoce.Shape
+        :param path: `.stl` file
+        :type path: str
+        :rtype: None | ExportStats
+        """
+        if self.streaming:
+            return write_stl(shape, path, self.delta)
+        to_stl(shape, path, self.delta)
+        return None
+
+
+class AdaptiveStlExporter(object):
+    def __init__(self, planar_delta, curved_delta, angular_tolerance, max_delta=None):
+        """
+        :param planar_delta: chordal deviation of planar faces
+        :type planar_delta: float
+        :param curved_delta: minimal chordal deviation of curved faces
+        :type curved_delta: float
+        :param angular_tolerance: maximal angle between normals of adjacent facets in radians
+        :type angular_tolerance: float
+        :param max_delta: maximal chordal deviation of curved faces, `planar_delta` by default
+        :type max_delta: None | float
+        """
+        self.planar_delta = planar_delta
+        self.curved_delta = curved_delta
+        self.angular_tolerance = angular_tolerance
+        self.max_delta = planar_delta if max_delta is None else max_delta
+        # Always writes binary STL, the same as a mesh written by `write_mesh`
+        self.streaming = True
+
+    @property
+    def tag(self):
+        """
+        :return: identifier of the tessellation settings, used in cache keys of meshes
+        :rtype: str
+        """
+        return (f'adaptive-{self.planar_delta!r}-{self.curved_delta!r}-'
+                f'{self.max_delta!r}-{self.angular_tolerance!r}')
+
+    @property
+    def export_tag(self):
+        """
+        :return: identifier of the export settings, used in cache keys of exported files
+        :rtype: str
+        """
+        return self.tag
+
+    def face_meshes(self, shape):
+        """
+        :type shape: pyservoce.libservoce.Shape
+        :rtype: typing.Iterator[(list[pyservoce.point3], list[(int, int, int)])]
+        """
+        return adaptive_face_meshes(shape, self.planar_delta, self.curved_delta,
+                                    self.angular_tolerance, self.max_delta)
+
+    def export(self, shape, path):
+        """
+        :type shape: pyservoce.libservoce.Shape
+        :param path: `.stl` file
+        :type path: str
+        :rtype: ExportStats
+        """
+        return stream_stl(self.face_meshes(shape), path)
+
+
+def write_mesh(mesh, paths, name='model', colour=None):
+    """
+    Writes a mesh to STL, compressed STL and 3MF files.
+
+    :type mesh: Mesh
+    :type paths: list[str]
+    :param name: part name stored in 3MF files
+    :type name: str
+    :param colour: part colour stored in 3MF files
+    :type colour: None | Color
+    :return: total size of the files in bytes
+    :rtype: int
+    """
+    size = 0
+    for path in paths:
+        if export_format(path) == '.3mf':
+            size += write_3mf([(name, mesh, colour)], path)
+        else:
+            size += mesh.write_stl(path)
+    return size
+
+
+def needs_mesh(paths):
+    """
+    :type paths: list[str]
+    :return: whether `export_shape` keeps a mesh in memory to write `paths`
+    :rtype: bool
+    """
+    mesh_paths = [path for path in paths if export_format(path) != '.brep']
+    # A single STL file is written by the exporter without the mesh in memory
+    return len(mesh_paths) > 1 or any(export_format(path) != '.stl' for path in mesh_paths)
+
+
+def export_shape(shape, paths, exporter, name='model', colour=None, mesh=None):
+    """
+    Writes `shape` to files in the formats given by their extensions, tessellating it at
+    most once.
+
+    :type shape: pyservoce.libservoce.Shape
+    :type paths: list[str]
+    :type exporter: StlExporter | AdaptiveStlExporter
+    :param name: part name stored in 3MF files
+    :type name: str
+    :param colour: part colour stored in 3MF files
+    :type colour: None | Color
+    :param mesh: tessellation of `shape`, if it is already made; a single STL file is
+        written from it only by streaming exporters, whose output is the same binary STL
+    :type mesh: None | Mesh
+    :return: statistics of the tessellation, if it was made by this module
+    :rtype: None | ExportStats
+    """
+    mesh_paths = []
+    for path in paths:
+        if export_format(path) == '.brep':
+            to_brep(shape, path)
+        else:
+            mesh_paths.append(path)
+    if not mesh_paths:
+        return None
+    if not needs_mesh(mesh_paths) and (mesh is None or not exporter.streaming):
+        return exporter.export(shape, mesh_paths[0])
+
+    start = time.perf_counter()
+    mesh = mesh or Mesh(exporter.face_meshes(shape))
+    size = write_mesh(mesh, mesh_paths, name, colour)
+    return ExportStats(len(mesh.triangles), size, time.perf_counter() - start)
@@ -0,0 +1,166 @@
+"""
+Feature graph of case construction.
+
+A case part is built by a sequence of named features (cuts, additions, fillets). Every
+feature consumes the solid produced by the previous one and declares which case
+parameters and device parts it depends on. The key of a feature combines the key of the
+previous feature with the values of its own dependencies and its source code, so changing
+a parameter or a feature function invalidates only the features downstream of the first
+changed one. Intermediate solids are memoized by these keys, memos outlive reloads of the
+model modules.
+"""
+import hashlib
+import inspect
+from collections import OrderedDict
+
+import config
+from api import fingerprint
+from profiler import stage
+
+# Memos by graph name, shared by graphs of reloaded modules
+_MEMOS = {}
+
+
+def _source(function, seen=None):
+    """
+    Returns the source code of a function and of the functions of its module it calls.
+
+    :type function: types.FunctionType
+    :type seen: None | set[types.FunctionType]
+    :rtype: str
+    """
+    seen = seen if seen is not None else set()
+    seen.add(function)
+    sources = [inspect.getsource(function)]
+    for name in function.__code__.co_names:
+        value = function.__globals__.get(name)
+        if (inspect.isfunction(value) and value.__module__ == function.__module__ and
+                value not in seen):
+            sources.append(_source(value, seen))
+    return '\n'.join(sources)
+
+
+class Feature(object):
+    def __init__(self, name, build, params=(), parts=(), cosmetic=False):
+        """
+        :type name: str
+        :param build: function of the previous solid (`None` for the first feature) and
+                      the device, returning the new solid
+        :type build: (None | pyservoce.libservoce.Shape, CompoundZenObj) ->
+                     pyservoce.libservoce.Shape
+        :param params: dotted names of the constants the feature depends on, resolved in
+                       the module of `build`, e.g. 'CaseProperties.smd_margin'
+        :type params: tuple[str]
+        :param parts: names of the device parts the feature depends on
+        :type parts: tuple[str]
+        :param cosmetic: whether the feature barely changes the shape, e.g. fillets, so
+                         previews skip it
+        :type cosmetic: bool
+        """
+        self.name = name
+        self.build = build
+        self.params = params
+        self.parts = parts
+        self.cosmetic = cosmetic
+        self.__source_digest = None
+
+    def param(self, name):
+        """
+        :type name: str
+        :rtype: object
+        """
+        path = name.split('.')
+        value = self.build.__globals__[path[0]]
+        for attr in path[1:]:
+            value = getattr(value, attr)
+        return value
+
+    def key(self, previous_key, device):
+        """
+        :type previous_key: str
+        :type device: CompoundZenObj
+        :rtype: str
+        """
+        if self.__source_digest is None:
+            self.__source_digest = hashlib.sha256(_source(self.build).encode()).hexdigest()
+
+        digest = hashlib.sha256(previous_key.encode())
+        digest.update(self.name.encode())
+        digest.update(self.__source_digest.encode())
+        for name in self.params:
+            digest.update(f'{name}={fingerprint(self.param(name))};'.encode())
+        for name in self.parts:
+            digest.update(f'{name}={fingerprint(device[name].bbox())};'.encode())
+        return digest.hexdigest()
+
+
+class FeatureGraph(object):
+    """
+    :type features: list[Feature]
+    """
+
+    max_memo_size = 128
+
+    def __init__(self, name):
+        """
+        :type name: str
+        """
+        self.name = name
+        self.features = []
+        self.__memo = _MEMOS.setdefault(name, OrderedDict())
+
+    def feature(self, name, params=(), parts=(), cosmetic=False):
+        """
+        Decorator appending a function to the graph as a feature.
+
+        :type name: str
+        :type params: tuple[str]
+        :type parts: tuple[str]
+        :type cosmetic: bool
+        """
+        def decorator(build):
+            self.features.append(Feature(name, build, params, parts, cosmetic))
+            return staticmethod(build)
+        return decorator
+
+    def clear(self):
+        """
+        Drops memoized intermediate solids.
+        """
+        self.__memo.clear()
+
+    def root_key(self):
+        """
+        :rtype: str
+        """
+        values = {k: v for k, v in vars(config).items() if k.isupper()}
+        return hashlib.sha256(f'{self.name}:{fingerprint(values)}'.encode()).hexdigest()
+
+    def build(self, device, preview=False):
+        """
+        Builds the solid, reusing memoized results of features with unchanged inputs.
+
+        :type device: CompoundZenObj
+        :param preview: skip cosmetic features, intermediate solids preceding the first
+                        skipped one are shared with full builds
+        :type preview: bool
+        :rtype: pyservoce.libservoce.Shape
+        """
+        key = self.root_key()
+        case = None
+        for feature in self.features:
+            if preview and feature.cosmetic:
+                continue
+            key = feature.key(key, device)
+            if key in self.__memo:
+                self.__memo.move_to_end(key)
+                case = self.__memo[key]
+                continue
+
+            with stage(f'{self.name}.{feature.name}') as record:
+                case = feature.build(case, device)
+                record.shape = case
+            self.__memo[key] = case
+            if len(self.__memo) > self.max_memo_size:
+                self.__memo.popitem(last=False)
+        return case
@@ -0,0 +1,64 @@
+"""
+Deferred import of the ZenCad viewer.
+
+`import zencad` always imports its Qt/OpenGL application, although only `show()` needs it.
+Importing this module before the first import of `zencad` makes the application module
+load lazily, on first use, so batch exports import only the geometry kernel.
+
+Only the modules in `VIEWER_MODULES` are deferred, a `from ... import` of them by ZenCad
+would still execute them. `viewer_imported()` tells whether Qt was imported anyway, the
+tests check it after an export.
+"""
+import importlib
+import importlib.abc
+import importlib.machinery
+import importlib.util
+import sys
+
+VIEWER_MODULES = frozenset([
+    'zencad.gui.application',
+])
+
+# Qt bindings the viewer may be built on
+QT_MODULES = ('PyQt5', 'PySide2')
+
+
+class _LazyViewerFinder(importlib.abc.MetaPathFinder):
+    def find_spec(self, fullname, path, target=None):
+        if fullname not in VIEWER_MODULES:
+            return None
+        spec = importlib.machinery.PathFinder.find_spec(fullname, path)
+        if spec is None or spec.loader is None:
+            return None
+        spec.loader = importlib.util.LazyLoader(spec.loader)
+        return spec
+
+
+def defer_viewer():
+    """
+    Installs the lazy import of the viewer modules. Has no effect on modules already
+    imported.
+    """
+    if not any(isinstance(f, _LazyViewerFinder) for f in sys.meta_path):
+        sys.meta_path.insert(0, _LazyViewerFinder())
+
+
+def load_viewer():
+    """
+    Executes the deferred viewer modules. `show()` needs it, as it refers to modules which
+    are imported by the viewer application.
+    """
+    for name in VIEWER_MODULES:
+        # Any attribute access executes a lazily loaded module
+        getattr(importlib.import_module(name), '__doc__')
+
+
+def viewer_imported():
+    """
+    :return: whether Qt is imported, e.g. by a viewer module imported eagerly
+    :rtype: bool
+    """
+    return any(name in sys.modules for name in QT_MODULES)
+
+
+defer_viewer()
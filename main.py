@@ -1,57 +1,307 @@
 #!/usr/bin/env python3
-from api import CompoundZenObj
-from case_model import CaseProperties, CaseBottom, CaseTop, CaseScrews
-from device_model import Battery, Device
-from slices_model import *
+import headless  # defers the viewer, must precede the first import of zencad
+
+import case_model
+import device_model
+from api import CompoundZenObj, Translation
+from cache import ShapeCache, model_digest
+from export import (
+    AdaptiveStlExporter, Mesh, StlExporter, export_format, export_shape, needs_mesh, write_3mf
+)
+from profiler import PROFILER, stage
 
 import argparse
+import math
+from concurrent.futures import ProcessPoolExecutor
+
+# Model classes are looked up in their modules, which the watch mode reloads
+CASE_PARTS = {
+    'top': 'CaseTop',
+    'bottom': 'CaseBottom',
+}
 
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument('--top')
-    parser.add_argument('--bottom')
+    parser.add_argument('--top', nargs='+', metavar='PATH',
+                        help='export the top part to .stl, .stl.gz, .stl.zst, .3mf or .brep files')
+    parser.add_argument('--bottom', nargs='+', metavar='PATH',
+                        help='export the bottom part to .stl, .stl.gz, .stl.zst, .3mf or .brep '
+                             'files')
+    parser.add_argument('--3mf', dest='bundle', metavar='PATH',
+                        help='export all parts of the model with their colours to a 3MF file')
     parser.add_argument('--delta', type=float, default=0.01)
+    parser.add_argument('--stream', action='store_true',
+                        help='write binary STL face by face with bounded memory')
+    parser.add_argument('--adaptive', action='store_true',
+                        help='choose the deviation of every face from its curvature, '
+                             'curved faces use deviations from --delta to --max-delta')
+    parser.add_argument('--planar-delta', type=float, default=0.1,
+                        help='deviation of planar faces in the adaptive mode')
+    parser.add_argument('--max-delta', type=float,
+                        help='coarsest deviation of curved faces in the adaptive mode, '
+                             '--planar-delta by default')
+    parser.add_argument('--angular-tolerance', type=float, default=15.0, metavar='DEGREES',
+                        help='angle between adjacent facets of curved faces in the adaptive mode')
+    parser.add_argument('--cache', metavar='DIR',
+                        help='directory of the persistent cache of built shapes')
+    parser.add_argument('--cache-max-size', type=float, metavar='MB',
+                        help='evict least recently used cache entries above this size')
+    parser.add_argument('--cache-max-age', type=float, metavar='DAYS',
+                        help='evict cache entries unused for this long')
+    parser.add_argument('--preview', action='store_true',
+                        help='skip fillets and face unification for a faster approximate build')
+    parser.add_argument('--watch', action='store_true',
+                        help='rebuild the displayed model when its source files change')
+    parser.add_argument('--jobs', type=int, default=1, metavar='N',
+                        help='build and export case parts in N worker processes')
+    parser.add_argument('--profile', action='store_true',
+                        help='print time, memory and topology of every construction stage')
+    parser.add_argument('--profile-json', metavar='PATH',
+                        help='also write the profile to a JSON file')
     args = parser.parse_args()
 
-    run(args.top, args.bottom, args.delta)
-
+    PROFILER.enabled = args.profile or bool(args.profile_json)
 
-def run(top_file, bottom_file, delta):
-    all_objects = create_model()
+    cache = None
+    if args.cache:
+        cache = ShapeCache(
+            args.cache,
+            max_size=args.cache_max_size and int(args.cache_max_size * 1024 * 1024),
+            max_age=args.cache_max_age and args.cache_max_age * 24 * 60 * 60,
+            mesh_delta=args.delta
+        )
 
-    if not (top_file or bottom_file):
-        display_model(all_objects)
+    if args.adaptive:
+        exporter = AdaptiveStlExporter(args.planar_delta, args.delta,
+                                       math.radians(args.angular_tolerance), args.max_delta)
     else:
-        if top_file:
-            export("top", all_objects.case.top.shape, top_file, delta)
-        if bottom_file:
-            export("bottom", all_objects.case.bottom.shape, bottom_file, delta)
+        exporter = StlExporter(args.delta, args.stream)
+
+    run(args.top, args.bottom, exporter, cache, args.jobs, args.bundle, args.watch,
+        args.preview)
+
+    if PROFILER.enabled:
+        print(PROFILER.report())
+        if args.profile_json:
+            PROFILER.dump_json(args.profile_json)
+
+
+def run(top_files, bottom_files, exporter, cache=None, jobs=1, bundle_file=None,
+        watch=False, preview=False):
+    """
+    :type top_files: None | list[str]
+    :type bottom_files: None | list[str]
+    :type exporter: StlExporter | AdaptiveStlExporter
+    :type cache: None | ShapeCache
+    :param jobs: number of worker processes used to build and export case parts
+    :type jobs: int
+    :param bundle_file: 3MF file of all parts of the model
+    :type bundle_file: None | str
+    :param watch: rebuild the displayed model when its source files change
+    :type watch: bool
+    :param preview: skip cosmetic features of case parts
+    :type preview: bool
+    """
+    files = {name: paths for name, paths in (('top', top_files), ('bottom', bottom_files))
+             if paths}
+    if not (files or bundle_file):
+        if watch:
+            from watch import LiveModel
+            live = LiveModel(create_internals,
+                             lambda internals: create_model(cache, internals, preview))
+            display_model(live.build(), live)
+        else:
+            display_model(create_model(cache, preview=preview))
+        return
+
+    for path in sum(files.values(), []):
+        # Fail on unsupported formats before building anything
+        export_format(path)
+
+    key = model_digest() if cache else None
+    for name, paths in list(files.items()):
+        for path in list(paths):
+            cached_name = cache_name(name, preview)
+            if cache and cache.load_export(key, cached_name, exporter.export_tag, path):
+                print(f'Copied cached "{name}" model to {path}')
+                paths.remove(path)
+        if not paths:
+            del files[name]
+
+    if bundle_file:
+        # The whole model is built anyway, so every part is tessellated once for all files
+        all_objects = create_model(cache, preview=preview)
+        with stage('export.tessellate'):
+            parts = [
+                (name, cached_mesh(cache, key, cache_name(name, preview), shape, exporter),
+                 colour)
+                for name, shape, colour in all_objects.leaves()
+            ]
+        meshes = {name: mesh for name, mesh, _ in parts}
+        for name, paths in files.items():
+            export(name, all_objects.case[name], paths, exporter, meshes[f'case.{name}'])
+            if cache:
+                store_exports(cache, key, cache_name(name, preview), exporter, paths)
+        print(f'Writing all parts to {bundle_file}...')
+        with stage('export.3mf'):
+            write_3mf(parts, bundle_file)
+        print('Ok')
+    elif files and jobs > 1:
+        # Case parts share only read-only internals, so every worker builds its own copy
+        with ProcessPoolExecutor(max_workers=min(jobs, len(files))) as executor:
+            futures = [
+                executor.submit(export_part, name, paths, exporter, cache, key, PROFILER.enabled,
+                                preview)
+                for name, paths in files.items()
+            ]
+            for future in futures:
+                PROFILER.records.extend(future.result())
+    elif files:
+        # Only the requested parts are built, device components are built on first use
+        device, battery = create_internals()
+        for name, paths in files.items():
+            part = build_case_part(name, device, battery, cache, preview)
+            export(name, part, paths, exporter, cache=cache, key=key, preview=preview)
+            if cache:
+                store_exports(cache, key, cache_name(name, preview), exporter, paths)
+
+    if cache:
+        cache.evict()
+
+
+def export(name, part, paths, exporter, mesh=None, cache=None, key=None, preview=False):
+    """
+    :type part: SimpleZenObj
+    :type paths: list[str]
+    :type exporter: StlExporter | AdaptiveStlExporter
+    :param mesh: tessellation of the part, if it is already made
+    :type mesh: None | Mesh
+    :param cache: cache of tessellations
+    :type cache: None | ShapeCache
+    :param key: cache key of the model
+    :type key: None | str
+    :param preview: whether the part is built without cosmetic features
+    :type preview: bool
+    """
+    print(f'Writing "{name}" model to {", ".join(paths)}...')
+    with stage(f'export.{name}'):
+        # ZenCad writes a single ASCII STL file itself, so a cached mesh is only used when
+        # it gives the same output as exporting without the cache
+        if mesh is None and cache and (needs_mesh(paths) or exporter.streaming):
+            # Named as leaves of the model, so meshes made for 3MF bundles are found too
+            mesh = cached_mesh(cache, key, cache_name(f'case.{name}', preview), part.shape,
+                               exporter, needs_mesh(paths))
+        stats = export_shape(part.shape, paths, exporter, name, part.colour, mesh)
+    print(f'Ok, {stats}' if stats else 'Ok')
+
+
+def cached_mesh(cache, key, name, shape, exporter, required=True):
+    """
+    Loads the tessellation of a shape from the cache, or makes and stores it.
+
+    :type cache: None | ShapeCache
+    :type key: None | str
+    :type name: str
+    :type shape: pyservoce.libservoce.Shape
+    :type exporter: StlExporter | AdaptiveStlExporter
+    :param required: make the tessellation if it isn't cached
+    :type required: bool
+    :rtype: None | Mesh
+    """
+    mesh = cache.load_mesh(key, name, exporter.tag) if cache else None
+    if mesh is None and required:
+        mesh = Mesh(exporter.face_meshes(shape))
+        if cache:
+            cache.store_mesh(key, name, exporter.tag, mesh)
+    return mesh
+
 
+def store_exports(cache, key, name, exporter, paths):
+    """
+    :type cache: ShapeCache
+    :type key: str
+    :type name: str
+    :type exporter: StlExporter | AdaptiveStlExporter
+    :type paths: list[str]
+    """
+    for path in paths:
+        cache.store_export(key, name, exporter.export_tag, path)
 
-def export(name, shape, path, delta):
-    print(f'Writing "{name}" model to {path}...')
-    to_stl(shape, path, delta)
-    print('Ok')
 
+def export_part(name, paths, exporter, cache=None, key=None, profile=False, preview=False):
+    """
+    Builds a single case part and exports it, used by worker processes.
+
+    :param name: 'top' or 'bottom'
+    :type name: str
+    :type paths: list[str]
+    :type exporter: StlExporter | AdaptiveStlExporter
+    :type cache: None | ShapeCache
+    :param key: cache key of the model
+    :type key: None | str
+    :param profile: whether to record construction stages
+    :type profile: bool
+    :param preview: skip cosmetic features
+    :type preview: bool
+    :return: recorded construction stages
+    :rtype: list[StageRecord]
+    """
+    PROFILER.enabled = profile
+    # Workers are reused for other parts, only the stages of this one are returned
+    PROFILER.records = []
+    device, battery = create_internals()
+    part = build_case_part(name, device, battery, cache, preview)
+    export(name, part, paths, exporter, cache=cache, key=key, preview=preview)
+    if cache:
+        store_exports(cache, key, cache_name(name, preview), exporter, paths)
+    return PROFILER.records
+
+
+def display_model(all_objects, live=None):
+    """
+    :type all_objects: CompoundZenObj
+    :param live: source of rebuilt models, `all_objects` is its first one
+    :type live: None | watch.LiveModel
+    """
+    # The viewer and the slicing helpers are needed only here
+    headless.load_viewer()
+    from zencad import show
 
-def display_model(all_objects):
     trans = None
     # trans = debug_transformations(all_objects.internals.device)
 
-    all_objects.hide('internals')
-    all_objects.case.hide('top')
+    if live:
+        # Rebuilt objects are swapped in by the animation thread of the viewer
+        live.display(all_objects, hide_parts, trans)
+        show(standalone=True, animate=live.animate, animate_step=live.interval)
+        return
 
+    hide_parts(all_objects)
     all_objects.display(trans=trans)
     show(standalone=True)
 
 
-def create_model():
-    device = Device().transformed(move(CaseProperties.pcb_offset))
-    battery = Battery().transformed(move(CaseProperties.battery_offset))
-    case_bottom = CaseBottom(device, battery)
-    case_top = CaseTop(device, battery)
-    screws = CaseScrews()
+def hide_parts(all_objects):
+    """
+    :type all_objects: CompoundZenObj
+    """
+    all_objects.hide('internals')
+    all_objects.case.hide('top')
+
+
+def create_model(cache=None, internals=None, preview=False):
+    """
+    :type cache: None | ShapeCache
+    :param internals: device and battery, created if `None`
+    :type internals: None | (CompoundZenObj, SimpleZenObj)
+    :param preview: skip cosmetic features of case parts
+    :type preview: bool
+    """
+    device, battery = internals or create_internals()
+    case_bottom = build_case_part('bottom', device, battery, cache, preview)
+    case_top = build_case_part('top', device, battery, cache, preview)
+    screws = case_model.CaseScrews()
 
     internals = CompoundZenObj(
         device=device,
@@ -69,7 +319,47 @@ def create_model():
     return all_objects
 
 
+def create_internals():
+    """
+    :rtype: (CompoundZenObj, SimpleZenObj)
+    """
+    properties = case_model.CaseProperties
+    device = device_model.Device().transformed(Translation(properties.pcb_offset))
+    battery = device_model.Battery().transformed(Translation(properties.battery_offset))
+    return device, battery
+
+
+def build_case_part(name, device, battery, cache=None, preview=False):
+    """
+    :param name: 'top' or 'bottom'
+    :type name: str
+    :type device: CompoundZenObj
+    :type battery: SimpleZenObj
+    :type cache: None | ShapeCache
+    :param preview: skip cosmetic features
+    :type preview: bool
+    :rtype: SimpleZenObj
+    """
+    cls = getattr(case_model, CASE_PARTS[name])
+    if cache:
+        return cache.build(cache_name(name, preview), cls, device, battery, preview=preview)
+    return cls(device, battery, preview=preview)
+
+
+def cache_name(name, preview=False):
+    """
+    :param name: 'top' or 'bottom'
+    :type name: str
+    :type preview: bool
+    :return: name of the cache entries of a case part, previews are cached separately
+    :rtype: str
+    """
+    return f'{name}-preview' if preview else name
+
+
 def debug_transformations(device):
+    from slices_model import SlicePoint, SliceShape
+
     if device is None:
         return None
 
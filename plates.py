@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+Print plates with many copies of case parts.
+
+Tops are flipped onto their outer face, bottoms are printed as built. Every part of every
+variant is built, oriented and tessellated once, and its footprint, the bounding rectangle
+of the mesh on the bed grown by half of the spacing, is reused for all of its copies.
+Footprints are packed onto the bed shrunk by half of the spacing, so parts keep the full
+spacing from each other and from the bed edges.
+Footprints are packed onto as few plates as possible by a skyline bottom-left heuristic,
+rotated by 90 degrees where it fits better, and every plate is written to a single STL or
+3MF file. 3MF plates store the mesh of a part once and its copies as placed build items.
+"""
+import headless  # noqa: F401, defers the viewer, must precede the first import of zencad
+
+import argparse
+import os
+
+from zencad import deg
+
+from api import BBox
+from cache import ShapeCache, model_digest
+from export import Node, StlExporter, StlStream, write_3mf
+from sweep import apply_overrides, load_variants
+
+FORMATS = ('3mf', 'stl', 'stl.gz', 'stl.zst')
+
+# Tolerance of comparisons of footprint coordinates in mm
+EPSILON = 1e-6
+
+
+class PlateItem(object):
+    """
+    Part oriented for printing, placed on plates as many times as needed.
+    """
+
+    def __init__(self, name, mesh, colour):
+        """
+        :type name: str
+        :param mesh: tessellation in the print orientation
+        :type mesh: Mesh
+        :type colour: None | Color
+        """
+        self.name = name
+        self.mesh = mesh
+        self.colour = colour
+        nodes = mesh.nodes
+        self.bbox = BBox(min(n.x for n in nodes), max(n.x for n in nodes),
+                         min(n.y for n in nodes), max(n.y for n in nodes),
+                         min(n.z for n in nodes), max(n.z for n in nodes))
+
+
+class Placement(object):
+    def __init__(self, item, x, y, rotated, spacing):
+        """
+        :type item: PlateItem
+        :param x: minimal x of the footprint on the plate
+        :type x: float
+        :param y: minimal y of the footprint on the plate
+        :type y: float
+        :param rotated: whether the part is rotated by 90 degrees around Z
+        :type rotated: bool
+        :param spacing: distance between parts
+        :type spacing: float
+        """
+        self.item = item
+        self.rotated = rotated
+        bbox = item.bbox
+        border = spacing / 2.0
+        # Rotation maps (x, y) to (-y, x), so the minimal corner comes from other bounds
+        if rotated:
+            self.offset = (x + border + bbox.ymax, y + border - bbox.xmin, -bbox.zmin)
+        else:
+            self.offset = (x + border - bbox.xmin, y + border - bbox.ymin, -bbox.zmin)
+
+    def matrix(self):
+        """
+        :return: 3MF transformation matrix
+        :rtype: tuple[float]
+        """
+        rotation = (0, 1, 0, -1, 0, 0, 0, 0, 1) if self.rotated else (1, 0, 0, 0, 1, 0, 0, 0, 1)
+        return rotation + self.offset
+
+    def nodes(self):
+        """
+        :return: mesh nodes of the item moved to the placement
+        :rtype: list[Node]
+        """
+        dx, dy, dz = self.offset
+        if self.rotated:
+            return [Node(dx - n.y, dy + n.x, dz + n.z) for n in self.item.mesh.nodes]
+        return [Node(dx + n.x, dy + n.y, dz + n.z) for n in self.item.mesh.nodes]
+
+
+class Skyline(object):
+    """
+    Upper outline of the footprints packed onto a plate, as segments of constant depth
+    along the bed width. New footprints are put at the lowest, then leftmost position.
+    """
+
+    def __init__(self, width, depth):
+        """
+        :type width: float
+        :type depth: float
+        """
+        self.width = width
+        self.depth = depth
+        # (x, y, width) of every segment, ordered by x
+        self.segments = [(0.0, 0.0, width)]
+
+    def find(self, width, depth):
+        """
+        :return: top, x and y of the best position of a footprint, `None` if it doesn't fit
+        :rtype: None | (float, float, float)
+        """
+        best = None
+        for i, (x, _, _) in enumerate(self.segments):
+            if x + width > self.width + EPSILON:
+                break
+            y = max(sy for sx, sy, _ in self.segments[i:] if sx < x + width - EPSILON)
+            if y + depth > self.depth + EPSILON:
+                continue
+            if best is None or (y + depth, x) < best[:2]:
+                best = (y + depth, x, y)
+        return best
+
+    def add(self, x, y, width, depth):
+        """
+        Raises the outline over a footprint placed at `x`, `y`.
+        """
+        end = x + width
+        segments = [(x, y + depth, width)]
+        for sx, sy, sw in self.segments:
+            if sx + sw <= x + EPSILON or sx >= end - EPSILON:
+                segments.append((sx, sy, sw))
+                continue
+            if sx < x:
+                segments.append((sx, sy, x - sx))
+            if sx + sw > end:
+                segments.append((end, sy, sx + sw - end))
+        segments.sort()
+
+        self.segments = []
+        for sx, sy, sw in segments:
+            if self.segments and abs(self.segments[-1][1] - sy) < EPSILON:
+                px, py, pw = self.segments.pop()
+                sx, sw = px, pw + sw
+            self.segments.append((sx, sy, sw))
+
+
+def pack(items, width, depth, spacing, rotate=True):
+    """
+    Packs copies of items onto plates.
+
+    :param items: items and numbers of their copies
+    :type items: list[(PlateItem, int)]
+    :param width: bed size along X
+    :type width: float
+    :param depth: bed size along Y
+    :type depth: float
+    :param spacing: distance between parts and from parts to the bed edges
+    :type spacing: float
+    :param rotate: allow rotating parts by 90 degrees
+    :type rotate: bool
+    :return: placements on every plate
+    :rtype: list[list[Placement]]
+    """
+    # Footprints have half of the spacing on every side, the other half is kept at edges
+    width, depth = width - spacing, depth - spacing
+    footprints = []
+    for item, count in items:
+        size = item.bbox.size
+        w, d = size.x + spacing, size.y + spacing
+        fits = w <= width + EPSILON and d <= depth + EPSILON
+        if rotate:
+            fits = fits or (d <= width + EPSILON and w <= depth + EPSILON)
+        if not fits:
+            raise ValueError(f'{item.name} ({size.x:.1f} x {size.y:.1f} mm) does not fit the bed')
+        # The footprint is computed once and shared by all copies
+        footprints.extend([(item, w, d)] * count)
+    # Large footprints first, small ones fill the gaps
+    footprints.sort(key=lambda f: max(f[1], f[2]), reverse=True)
+
+    plates = []
+    for item, w, d in footprints:
+        orientations = [(w, d, False)]
+        if rotate and abs(w - d) > EPSILON:
+            orientations.append((d, w, True))
+        for skyline, placements in plates:
+            if _place(skyline, placements, item, orientations, spacing):
+                break
+        else:
+            plates.append((Skyline(width, depth), []))
+            _place(*plates[-1], item, orientations, spacing)
+    return [placements for _, placements in plates]
+
+
+def _place(skyline, placements, item, orientations, spacing):
+    """
+    :type skyline: Skyline
+    :type placements: list[Placement]
+    :type item: PlateItem
+    :type orientations: list[(float, float, bool)]
+    :type spacing: float
+    :return: whether the item is placed
+    :rtype: bool
+    """
+    best = None
+    for w, d, rotated in orientations:
+        position = skyline.find(w, d)
+        if position is not None and (best is None or position[:2] < best[0][:2]):
+            best = (position, w, d, rotated)
+    if best is None:
+        return False
+    (_, x, y), w, d, rotated = best
+    skyline.add(x, y, w, d)
+    # The skyline covers the bed without its edges
+    border = spacing / 2.0
+    placements.append(Placement(item, x + border, y + border, rotated, spacing))
+    return True
+
+
+def orient(name, shape):
+    """
+    :param name: 'top' or 'bottom'
+    :type name: str
+    :type shape: pyservoce.libservoce.Shape
+    :return: shape in the print orientation, tops are flipped onto their outer face
+    :rtype: pyservoce.libservoce.Shape
+    """
+    return shape.rotateX(deg(180)) if name == 'top' else shape
+
+
+def build_items(copies, variants=None, delta=0.01, cache=None):
+    """
+    Builds, orients and tessellates every part once.
+
+    :param copies: numbers of copies by part names
+    :type copies: dict[str, int]
+    :param variants: variants of the model, the current parameters if `None`
+    :type variants: None | list[sweep.Variant]
+    :type delta: float
+    :type cache: None | ShapeCache
+    :return: items and numbers of their copies
+    :rtype: list[(PlateItem, int)]
+    """
+    from main import build_case_part, cached_mesh, create_internals
+
+    exporter = StlExporter(delta)
+    items = []
+    for variant in variants or [None]:
+        if variant is not None:
+            apply_overrides(variant.overrides)
+        key = model_digest() if cache else None
+        device, battery = create_internals()
+        for name, count in copies.items():
+            if not count:
+                continue
+            part = build_case_part(name, device, battery, cache)
+            print(f'Tessellating "{name}" model{f" of {variant.name}" if variant else ""}...')
+            mesh = cached_mesh(cache, key, f'plate.{name}', orient(name, part.shape), exporter)
+            item_name = f'{variant.name}-{name}' if variant else name
+            items.append((PlateItem(item_name, mesh, part.colour), count))
+    return items
+
+
+def write_plate(placements, path):
+    """
+    :type placements: list[Placement]
+    :param path: `.3mf`, `.stl`, `.stl.gz` or `.stl.zst` file
+    :type path: str
+    """
+    if path.endswith('.3mf'):
+        parts = []
+        indices = {}
+        for placement in placements:
+            item = placement.item
+            if item.name not in indices:
+                indices[item.name] = len(parts)
+                parts.append((item.name, item.mesh, item.colour))
+        write_3mf(parts, path, [(indices[p.item.name], p.matrix()) for p in placements])
+        return
+
+    triangles = sum(len(p.item.mesh.triangles) for p in placements)
+    with StlStream(path, triangles=triangles) as stream:
+        for placement in placements:
+            stream.write_mesh(placement.nodes(), placement.item.mesh.triangles)
+
+
+def run(copies, output, formats, bed=(220.0, 220.0), spacing=5.0, rotate=True, variants=None,
+        delta=0.01, cache=None):
+    """
+    :param copies: numbers of copies by part names
+    :type copies: dict[str, int]
+    :param output: directory of plate files
+    :type output: str
+    :param formats: file formats of every plate
+    :type formats: list[str]
+    :param bed: width and depth of the print bed
+    :type bed: (float, float)
+    :param spacing: distance between parts and from parts to the bed edges
+    :type spacing: float
+    :param rotate: allow rotating parts by 90 degrees
+    :type rotate: bool
+    :type variants: None | list[sweep.Variant]
+    :type delta: float
+    :type cache: None | ShapeCache
+    :return: paths of the plate files
+    :rtype: list[str]
+    """
+    items = build_items(copies, variants, delta, cache)
+    plates = pack(items, bed[0], bed[1], spacing, rotate)
+
+    os.makedirs(output, exist_ok=True)
+    paths = []
+    for number, placements in enumerate(plates, 1):
+        area = sum(p.item.bbox.size.x * p.item.bbox.size.y for p in placements)
+        print(f'Plate {number}: {len(placements)} parts, '
+              f'{100.0 * area / (bed[0] * bed[1]):.0f}% of the bed')
+        for plate_format in formats:
+            path = os.path.join(output, f'plate-{number:02d}.{plate_format}')
+            print(f'Writing {path}...')
+            write_plate(placements, path)
+            paths.append(path)
+    if cache:
+        cache.evict()
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Arrange copies of case parts on print plates')
+    parser.add_argument('--top', type=int, default=0, metavar='N',
+                        help='number of top parts of every variant')
+    parser.add_argument('--bottom', type=int, default=0, metavar='N',
+                        help='number of bottom parts of every variant')
+    parser.add_argument('--sweep', metavar='PATH',
+                        help='JSON or YAML sweep file with the variants to print, see sweep.py')
+    parser.add_argument('--bed', type=float, nargs=2, default=(220.0, 220.0),
+                        metavar=('WIDTH', 'DEPTH'), help='print bed size in mm')
+    parser.add_argument('--spacing', type=float, default=5.0, metavar='MM',
+                        help='distance between parts and from parts to the bed edges')
+    parser.add_argument('--no-rotate', action='store_true',
+                        help="don't rotate parts by 90 degrees")
+    parser.add_argument('--format', nargs='+', choices=FORMATS, default=['3mf'],
+                        help='file formats of every plate')
+    parser.add_argument('--output', default='plates', help='output directory')
+    parser.add_argument('--delta', type=float, default=0.01)
+    parser.add_argument('--cache', metavar='DIR',
+                        help='directory of the persistent cache of built shapes')
+    args = parser.parse_args()
+
+    if not (args.top or args.bottom):
+        parser.error('no parts, use --top and/or --bottom')
+    variants = load_variants(args.sweep)[1] if args.sweep else None
+    cache = ShapeCache(args.cache) if args.cache else None
+    paths = run({'top': args.top, 'bottom': args.bottom}, args.output, args.format,
+                tuple(args.bed), args.spacing, not args.no_rotate, variants, args.delta, cache)
+    print(f'Ok, {len(paths)} files')
+
+
+if __name__ == '__main__':
+    main()
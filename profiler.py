@@ -0,0 +1,181 @@
+"""
+Instrumentation of named model construction stages.
+
+Stages are recorded only while `PROFILER.enabled` is set, otherwise `stage()` costs a
+single attribute check.
+"""
+import json
+import resource
+import time
+from contextlib import contextmanager
+
+import evalcache
+
+
+class StageRecord(object):
+    """
+    :type shape: None | pyservoce.libservoce.Shape
+    """
+
+    def __init__(self, name):
+        """
+        :type name: str
+        """
+        self.name = name
+        self.shape = None
+        self.wall_time = 0.0
+        self.rss_peak = None
+        self.rss_delta = None
+        self.faces = None
+        self.edges = None
+
+    def to_dict(self):
+        """
+        :rtype: dict
+        """
+        return {
+            'name': self.name,
+            'wall_time': self.wall_time,
+            'rss_peak': self.rss_peak,
+            'rss_delta': self.rss_delta,
+            'faces': self.faces,
+            'edges': self.edges,
+        }
+
+
+def _rss():
+    """
+    :return: current resident set size of the process in bytes, `None` without procfs
+    :rtype: None | int
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        return None
+
+
+def _peak_rss():
+    """
+    :return: peak resident set size of the process since the last `_reset_peak_rss()` in
+        bytes, `None` without procfs
+    :rtype: None | int
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak_rss():
+    """
+    Resets the peak resident set size of the process to the current one.
+
+    :return: whether the peak was reset, it is supported since Linux 4.0
+    :rtype: bool
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+class Profiler(object):
+    """
+    :type records: list[StageRecord]
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.records = []
+        # Stages being recorded, outermost first
+        self._open = []
+
+    def _update_peaks(self):
+        """
+        Accounts the peak resident set size since the last reset to all open stages.
+        """
+        peak = _peak_rss()
+        for record in self._open:
+            if record.rss_peak is not None and peak is not None:
+                record.rss_peak = max(record.rss_peak, peak)
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Records a construction stage. The body may assign the resulting shape to
+        `record.shape` to count its faces and edges.
+
+        :type name: str
+        :rtype: typing.Iterator[StageRecord]
+        """
+        record = StageRecord(name)
+        if not self.enabled:
+            yield record
+            return
+
+        # The peak of the process is reset for every stage, so peaks reached by enclosing
+        # stages before are kept in their records
+        self._update_peaks()
+        rss = _rss()
+        if rss is not None and _reset_peak_rss():
+            record.rss_peak = rss
+        self._open.append(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record.wall_time = time.perf_counter() - start
+            self._update_peaks()
+            self._open.pop()
+        if rss is not None:
+            record.rss_delta = _rss() - rss
+        if record.shape is not None:
+            shape = evalcache.unlazy_if_need(record.shape)
+            record.faces = len(shape.faces())
+            record.edges = len(shape.edges())
+            # Do not keep shapes alive, records may also be sent between processes
+            record.shape = None
+        self.records.append(record)
+
+    def report(self):
+        """
+        :return: table of stages sorted by wall time, slowest first
+        :rtype: str
+        """
+        width = max([len('stage')] + [len(r.name) for r in self.records])
+        lines = [f'{"stage":<{width}}  {"wall, s":>9}  {"peak RSS, MB":>12}  '
+                 f'{"RSS change, MB":>14}  {"faces":>7}  {"edges":>7}']
+        for r in sorted(self.records, key=lambda r: r.wall_time, reverse=True):
+            peak = '-' if r.rss_peak is None else f'{r.rss_peak / 1024 / 1024:.1f}'
+            rss = '-' if r.rss_delta is None else f'{r.rss_delta / 1024 / 1024:+.1f}'
+            faces = '-' if r.faces is None else r.faces
+            edges = '-' if r.edges is None else r.edges
+            lines.append(f'{r.name:<{width}}  {r.wall_time:>9.3f}  {peak:>12}  {rss:>14}  '
+                         f'{faces:>7}  {edges:>7}')
+        return '\n'.join(lines)
+
+    def dump_json(self, path):
+        """
+        :type path: str
+        """
+        with open(path, 'w') as f:
+            json.dump([r.to_dict() for r in self.records], f, indent=2)
+
+
+PROFILER = Profiler()
+
+
+def stage(name):
+    """
+    Shortcut for `PROFILER.stage(name)`.
+
+    :type name: str
+    """
+    return PROFILER.stage(name)
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+Cross-sections of the whole model rendered to PNG and SVG images without the viewer.
+
+Planes are given by a point and a normal (`--plane`) or swept along an axis (`--axis`).
+Every part of the model is cut with the halfspace tools of `slices_model`, faces of the
+cut lying on the plane are projected on it and drawn in the colour of the part. Sections
+with the same normal share the image frame, so images of two builds can be compared pixel
+by pixel, e.g. for visual regression tests of the fit.
+
+Planes are distributed between worker processes, every worker builds its own model.
+"""
+import headless  # noqa: F401, defers the viewer, must precede the first import of zencad
+
+import argparse
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy
+from PIL import Image, ImageDraw
+from zencad import vector3
+
+from cache import ShapeCache
+from export import face_meshes, hex_colour
+from slices_model import SlicePoint
+
+AXES = {
+    'x': (1.0, 0.0, 0.0),
+    'y': (0.0, 1.0, 0.0),
+    'z': (0.0, 0.0, 1.0),
+}
+
+FORMATS = ('png', 'svg')
+
+# Distance from the plane within which tessellation nodes lie on it
+PLANE_TOLERANCE = 1e-3
+
+
+class Plane(object):
+    def __init__(self, name, center, normal):
+        """
+        :param name: name of the image files
+        :type name: str
+        :type center: (float, float, float)
+        :param normal: unit vector
+        :type normal: (float, float, float)
+        """
+        self.name = name
+        self.center = center
+        self.normal = normal
+
+    def basis(self):
+        """
+        :return: unit vectors of the image axes, the second one points up if possible
+        :rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        normal = numpy.array(self.normal)
+        up = (0.0, 1.0, 0.0) if abs(normal[2]) > 0.9 else (0.0, 0.0, 1.0)
+        u = numpy.cross(up, normal)
+        u /= numpy.linalg.norm(u)
+        return u, numpy.cross(normal, u)
+
+    def distances(self, points):
+        """
+        :param points: (N, 3) array
+        :type points: numpy.ndarray
+        :return: signed distances of `points` to the plane
+        :rtype: numpy.ndarray
+        """
+        return (points - self.center) @ numpy.array(self.normal)
+
+    def project(self, points):
+        """
+        :param points: (N, 3) array
+        :type points: numpy.ndarray
+        :return: (N, 2) array of image coordinates in mm
+        :rtype: numpy.ndarray
+        """
+        u, v = self.basis()
+        return numpy.stack([points @ u, points @ v], axis=1)
+
+    def to_dict(self):
+        """
+        :rtype: dict
+        """
+        return {'name': self.name, 'center': self.center, 'normal': self.normal}
+
+
+def _corners(bbox):
+    """
+    :type bbox: BBox
+    :rtype: numpy.ndarray
+    """
+    return numpy.array([(x, y, z)
+                        for x in (bbox.xmin, bbox.xmax)
+                        for y in (bbox.ymin, bbox.ymax)
+                        for z in (bbox.zmin, bbox.zmax)])
+
+
+def parse_plane(index, value):
+    """
+    :param value: `X,Y,Z,NX,NY,NZ`
+    :type value: str
+    :rtype: Plane
+    """
+    coordinates = [float(c) for c in value.split(',')]
+    if len(coordinates) != 6:
+        raise ValueError(f'Expected a point and a normal, got {value!r}')
+    normal = numpy.array(coordinates[3:])
+    normal = normal / numpy.linalg.norm(normal)
+    return Plane(f'plane{index}', tuple(coordinates[:3]), tuple(float(n) for n in normal))
+
+
+def sweep_planes(axis, step, start, stop):
+    """
+    :param axis: 'x', 'y' or 'z'
+    :type axis: str
+    :type step: float
+    :type start: float
+    :type stop: float
+    :return: planes perpendicular to `axis` from `start` to `stop` inclusive
+    :rtype: list[Plane]
+    """
+    normal = AXES[axis]
+    count = int(math.floor((stop - start) / step + 1e-9)) + 1
+    planes = []
+    for i in range(max(0, count)):
+        offset = start + i * step
+        center = tuple(offset * n for n in normal)
+        planes.append(Plane(f'{axis}{offset:+08.3f}', center, normal))
+    return planes
+
+
+def model_parts(model):
+    """
+    :type model: ZenObj
+    :return: shapes, colours and (8, 3) arrays of bounding box corners of model parts,
+        the boxes come from the objects, so memoized and analytic ones are reused
+    :rtype: list[(pyservoce.libservoce.Shape, None | Color, numpy.ndarray)]
+    """
+    return [(obj.shape, colour, _corners(obj.bbox())) for _, obj, colour in model.leaf_objects()]
+
+
+def section(parts, plane, delta):
+    """
+    Cuts every part with the plane.
+
+    :param parts: shapes, colours and bounding box corners of model parts
+    :type parts: list[(pyservoce.libservoce.Shape, None | Color, numpy.ndarray)]
+    :type plane: Plane
+    :param delta: deviation of the tessellation of curved section edges
+    :type delta: float
+    :return: colours of cut parts and (T, 3, 2) arrays of their section triangles
+    :rtype: list[(None | Color, numpy.ndarray)]
+    """
+    cut = SlicePoint(vector3(*plane.center), plane.normal)
+    sections = []
+    for shape, colour, corners in parts:
+        distances = plane.distances(corners)
+        if distances.min() > PLANE_TOLERANCE or distances.max() < -PLANE_TOLERANCE:
+            continue
+
+        triangles = []
+        for nodes, face_triangles in face_meshes(cut(shape), delta):
+            if not face_triangles:
+                continue
+            points = numpy.array([(p.x, p.y, p.z) for p in nodes])
+            if numpy.abs(plane.distances(points)).max() > PLANE_TOLERANCE:
+                continue
+            triangles.append(plane.project(points)[numpy.array(face_triangles)])
+        if triangles:
+            sections.append((colour, numpy.concatenate(triangles)))
+    return sections
+
+
+def image_frame(parts, plane, border=1.0):
+    """
+    :type parts: list[(pyservoce.libservoce.Shape, None | Color, numpy.ndarray)]
+    :type plane: Plane
+    :param border: width of the empty border in mm
+    :type border: float
+    :return: minimal and maximal image coordinates of the whole model in mm
+    :rtype: (float, float, float, float)
+    """
+    projected = plane.project(numpy.concatenate([corners for _, _, corners in parts]))
+    umin, vmin = projected.min(axis=0) - border
+    umax, vmax = projected.max(axis=0) + border
+    return float(umin), float(umax), float(vmin), float(vmax)
+
+
+def write_png(sections, frame, resolution, path):
+    """
+    :type sections: list[(None | Color, numpy.ndarray)]
+    :type frame: (float, float, float, float)
+    :param resolution: pixels per mm
+    :type resolution: float
+    :type path: str
+    """
+    umin, umax, vmin, vmax = frame
+    size = (math.ceil((umax - umin) * resolution), math.ceil((vmax - vmin) * resolution))
+    image = Image.new('RGB', size, 'white')
+    draw = ImageDraw.Draw(image)
+    for colour, triangles in sections:
+        fill = hex_colour(colour)
+        pixels = (triangles - (umin, vmax)) * (resolution, -resolution)
+        for triangle in pixels:
+            draw.polygon([tuple(p) for p in triangle], fill=fill)
+    image.save(path)
+
+
+def write_svg(sections, frame, path):
+    """
+    :type sections: list[(None | Color, numpy.ndarray)]
+    :type frame: (float, float, float, float)
+    :type path: str
+    """
+    umin, umax, vmin, vmax = frame
+    width, height = umax - umin, vmax - vmin
+    with open(path, 'w') as f:
+        f.write(f'<svg xmlns="http://www.w3.org/2000/svg" width="{width:.3f}mm" '
+                f'height="{height:.3f}mm" viewBox="0 0 {width:.3f} {height:.3f}">\n')
+        f.write(f' <rect width="{width:.3f}" height="{height:.3f}" fill="white"/>\n')
+        for colour, triangles in sections:
+            fill = hex_colour(colour)
+            points = (triangles - (umin, vmax)) * (1.0, -1.0)
+            # Strokes of the fill colour hide seams between antialiased triangles
+            f.write(f' <path fill="{fill}" stroke="{fill}" stroke-width="0.01" d="')
+            f.write(' '.join(
+                'M{:.4f},{:.4f}L{:.4f},{:.4f}L{:.4f},{:.4f}Z'.format(*t.ravel()) for t in points
+            ))
+            f.write('"/>\n')
+        f.write('</svg>\n')
+
+
+def render_planes(planes, output, formats, resolution=10.0, delta=0.05, cache=None,
+                  preview=False):
+    """
+    Builds the model and renders its sections, used by worker processes.
+
+    :type planes: list[Plane]
+    :param output: directory of the images
+    :type output: str
+    :param formats: 'png' and/or 'svg'
+    :type formats: list[str]
+    :param resolution: pixels per mm of PNG images
+    :type resolution: float
+    :param delta: deviation of the tessellation of curved section edges
+    :type delta: float
+    :type cache: None | ShapeCache
+    :param preview: cut case parts built without cosmetic features
+    :type preview: bool
+    :return: manifest entries
+    :rtype: list[dict]
+    """
+    from main import create_model
+
+    parts = model_parts(create_model(cache, preview=preview))
+    frames = {}
+    entries = []
+    for plane in planes:
+        if plane.normal not in frames:
+            frames[plane.normal] = image_frame(parts, plane)
+        frame = frames[plane.normal]
+
+        print(f'Rendering section {plane.name}...')
+        sections = section(parts, plane, delta)
+        files = []
+        for image_format in formats:
+            path = os.path.join(output, f'{plane.name}.{image_format}')
+            if image_format == 'png':
+                write_png(sections, frame, resolution, path)
+            else:
+                write_svg(sections, frame, path)
+            files.append(path)
+        entries.append(dict(plane.to_dict(), files=files))
+    return entries
+
+
+def model_range(axis, cache=None, preview=False):
+    """
+    :type axis: str
+    :type cache: None | ShapeCache
+    :type preview: bool
+    :return: extent of the model along `axis`
+    :rtype: (float, float)
+    """
+    from main import create_model
+
+    bbox = create_model(cache, preview=preview).bbox()
+    return getattr(bbox, f'{axis}min'), getattr(bbox, f'{axis}max')
+
+
+def run(planes, output, formats, resolution=10.0, delta=0.05, cache=None, preview=False,
+        jobs=None):
+    """
+    Renders sections in parallel and writes `sections.json` listing them.
+
+    :type planes: list[Plane]
+    :type output: str
+    :type formats: list[str]
+    :type resolution: float
+    :type delta: float
+    :type cache: None | ShapeCache
+    :type preview: bool
+    :param jobs: number of worker processes, all sections are rendered in this process
+                 if it is 1
+    :type jobs: None | int
+    """
+    os.makedirs(output, exist_ok=True)
+    options = (output, formats, resolution, delta, cache, preview)
+    if jobs == 1:
+        entries = render_planes(planes, *options)
+    else:
+        jobs = min(jobs or os.cpu_count() or 1, len(planes)) or 1
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(render_planes, planes[i::jobs], *options)
+                       for i in range(jobs)]
+            entries = [e for future in futures for e in future.result()]
+        order = {plane.name: i for i, plane in enumerate(planes)}
+        entries.sort(key=lambda e: order[e['name']])
+
+    manifest = os.path.join(output, 'sections.json')
+    with open(manifest, 'w') as f:
+        json.dump({'resolution': resolution, 'sections': entries}, f, indent=2)
+    print(f'Ok, {len(entries)} sections, manifest written to {manifest}')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Render cross-sections of the model to PNG and SVG images')
+    parser.add_argument('--plane', action='append', default=[], metavar='X,Y,Z,NX,NY,NZ',
+                        help='section plane given by a point and a normal')
+    parser.add_argument('--axis', choices=sorted(AXES),
+                        help='sweep section planes perpendicular to the axis')
+    parser.add_argument('--step', type=float, default=1.0, metavar='MM',
+                        help='distance between swept planes')
+    parser.add_argument('--range', type=float, nargs=2, metavar=('START', 'STOP'),
+                        help='extent of the sweep, the whole model by default')
+    parser.add_argument('--format', nargs='+', choices=FORMATS, default=['png'],
+                        help='image formats')
+    parser.add_argument('--resolution', type=float, default=10.0, metavar='PX',
+                        help='pixels per mm of PNG images')
+    parser.add_argument('--delta', type=float, default=0.05,
+                        help='deviation of the tessellation of curved section edges')
+    parser.add_argument('--output', default='sections', help='output directory')
+    parser.add_argument('--cache', metavar='DIR',
+                        help='directory of the persistent cache of built shapes')
+    parser.add_argument('--preview', action='store_true',
+                        help='cut case parts built without cosmetic features')
+    parser.add_argument('--jobs', type=int, help='number of worker processes')
+    args = parser.parse_args()
+
+    cache = ShapeCache(args.cache) if args.cache else None
+    planes = [parse_plane(i, value) for i, value in enumerate(args.plane)]
+    if args.axis:
+        start, stop = args.range or model_range(args.axis, cache, args.preview)
+        planes += sweep_planes(args.axis, args.step, start, stop)
+    if not planes:
+        parser.error('no section planes, use --plane or --axis')
+
+    run(planes, args.output, args.format, args.resolution, args.delta, cache, args.preview,
+        args.jobs)
+
+
+if __name__ == '__main__':
+    main()
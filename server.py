@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Build server keeping the geometry kernel and recently built models in memory.
+
+Clients connect to a UNIX socket and send JSON requests, one per line:
+
+    {
+        "overrides": {"config.LEVER_ANGLE": 30, "CaseProperties.pcb_margin": 1.8},
+        "files": {"top": ["top.stl"], "bottom": ["variants/bottom.3mf"]},
+        "delta": 0.01
+    }
+
+Overrides have the format of sweep files (see `sweep.py`), files are written in the
+formats supported by `export.py`. Every request gets a single line response:
+`{"ok": true, "cached": [...], "seconds": 0.02}` listing files copied from the cache, or
+`{"ok": false, "error": "..."}`. The request `{"command": "shutdown"}` stops the server.
+
+Only the user running the server can connect to the socket, and files are written only
+inside the output directory, paths of requests are relative to it.
+
+Case parts of the most recent variants are kept in memory and exported files in the
+cache directory, so repeated requests for a variant only copy files.
+"""
+import headless  # noqa: F401, defers the viewer, must precede the first import of zencad
+
+import argparse
+import json
+import os
+import shutil
+import socket
+import socketserver
+import stat
+import sys
+import tempfile
+import time
+import traceback
+from collections import OrderedDict
+
+import case_model
+import device_model
+from api import Translation
+from cache import ShapeCache, model_digest
+from export import StlExporter, export_format, export_shape
+from sweep import PART_CLASSES, Variant, apply_case_overrides, apply_overrides
+
+
+class ModelServer(object):
+    """
+    Builds and exports case variants, reusing the device model while only case parameters
+    change and the case parts of the `max_models` most recent variants.
+    """
+
+    def __init__(self, cache, output, max_models=16):
+        """
+        :param cache: cache of built shapes and exported files
+        :type cache: ShapeCache
+        :param output: directory of exported files
+        :type output: str
+        :param max_models: number of variants whose case parts are kept in memory
+        :type max_models: int
+        """
+        self.cache = cache
+        self.output = os.path.realpath(output)
+        self.max_models = max_models
+        self.__overrides = None
+        self.__device_overrides = None
+        self.__device = None
+        self.__battery = None
+        self.__internals = None
+        self.__parts = OrderedDict()
+
+    def select(self, overrides):
+        """
+        Applies parameter overrides, reloading the device model only if its parameters
+        change.
+
+        :type overrides: dict[str, object]
+        """
+        if overrides == self.__overrides:
+            return
+
+        device_overrides = Variant('request', overrides).device_overrides()
+        # A failed reload leaves modules half-updated, so they are reloaded next time
+        self.__overrides = None
+        if device_overrides != self.__device_overrides:
+            self.__device_overrides = None
+            apply_overrides(overrides)
+            self.__device = device_model.Device()
+            self.__battery = device_model.Battery()
+            self.__device_overrides = device_overrides
+        else:
+            apply_case_overrides(overrides)
+
+        properties = case_model.CaseProperties
+        self.__internals = (
+            self.__device.transformed(Translation(properties.pcb_offset)),
+            self.__battery.transformed(Translation(properties.battery_offset)),
+        )
+        self.__overrides = overrides
+
+    def part(self, name):
+        """
+        :param name: 'top' or 'bottom'
+        :type name: str
+        :rtype: SimpleZenObj
+        """
+        key = (model_digest(), name)
+        if key in self.__parts:
+            self.__parts.move_to_end(key)
+            return self.__parts[key]
+
+        cls = getattr(case_model, PART_CLASSES[name])
+        part = self.cache.build(name, cls, *self.__internals)
+        self.__parts[key] = part
+        if len(self.__parts) > self.max_models * len(PART_CLASSES):
+            self.__parts.popitem(last=False)
+        return part
+
+    def output_path(self, path):
+        """
+        :param path: path relative to the output directory
+        :type path: str
+        :return: absolute path inside the output directory
+        :rtype: str
+        :raises ValueError: if the path, with symbolic links resolved, leads outside of it
+        """
+        resolved = os.path.realpath(os.path.join(self.output, path))
+        if os.path.commonpath([resolved, self.output]) != self.output:
+            raise ValueError(f'{path!r} is outside of the output directory')
+        return resolved
+
+    def export(self, request):
+        """
+        Handles an export request, see the module documentation for its format.
+
+        :type request: dict
+        :return: response fields
+        :rtype: dict
+        """
+        start = time.perf_counter()
+        files = {}
+        for name, paths in request.get('files', {}).items():
+            if name not in PART_CLASSES:
+                raise ValueError(f'Unknown part {name!r}, expected one of {list(PART_CLASSES)}')
+            for path in paths:
+                export_format(path)
+            files[name] = [self.output_path(path) for path in paths]
+        for path in sum(files.values(), []):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self.select(request.get('overrides', {}))
+        exporter = StlExporter(request.get('delta', 0.01))
+        key = model_digest()
+        cached = []
+        for name, paths in files.items():
+            missing = []
+            for path in paths:
+                if self.cache.load_export(key, name, exporter.export_tag, path):
+                    cached.append(path)
+                else:
+                    missing.append(path)
+            if missing:
+                part = self.part(name)
+                export_shape(part.shape, missing, exporter, name, part.colour)
+                for path in missing:
+                    self.cache.store_export(key, name, exporter.export_tag, path)
+
+        self.cache.evict()
+        return {'cached': cached, 'seconds': time.perf_counter() - start}
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                if request.get('command') == 'shutdown':
+                    self.server.running = False
+                    response = {'ok': True}
+                else:
+                    response = dict(self.server.model.export(request), ok=True)
+            except Exception as e:
+                traceback.print_exc()
+                response = {'ok': False, 'error': f'{type(e).__name__}: {e}'}
+            self.wfile.write(json.dumps(response).encode() + b'\n')
+
+
+class _UnixServer(socketserver.UnixStreamServer):
+    def __init__(self, path, model):
+        """
+        :type path: str
+        :type model: ModelServer
+        """
+        super().__init__(path, _RequestHandler)
+        self.model = model
+        self.running = True
+
+
+def serve(path, model):
+    """
+    Handles requests one by one, as the kernel and the model modules are not thread-safe,
+    until a shutdown request.
+
+    :param path: UNIX socket path
+    :type path: str
+    :type model: ModelServer
+    """
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        pass
+    else:
+        # A socket left by a previous server is replaced, other files are kept
+        if not stat.S_ISSOCK(mode):
+            raise FileExistsError(f'{path} exists and is not a socket')
+        os.remove(path)
+    # The socket is created accessible to the owner only, clients can write files
+    umask = os.umask(0o177)
+    try:
+        server = _UnixServer(path, model)
+    finally:
+        os.umask(umask)
+    os.chmod(path, 0o600)
+    with server:
+        print(f'Listening on {path}')
+        try:
+            while server.running:
+                server.handle_request()
+        finally:
+            os.remove(path)
+
+
+def request(path, message):
+    """
+    Sends a request to a running server.
+
+    :param path: UNIX socket path
+    :type path: str
+    :type message: dict
+    :return: response
+    :rtype: dict
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        sock.sendall(json.dumps(message).encode() + b'\n')
+        sock.shutdown(socket.SHUT_WR)
+        with sock.makefile('rb') as f:
+            return json.loads(f.readline())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build server for case variants')
+    parser.add_argument('socket', help='UNIX socket path')
+    parser.add_argument('--send', metavar='JSON',
+                        help='send a request to a running server and print the response')
+    parser.add_argument('--cache', metavar='DIR',
+                        help='cache directory, a temporary one by default')
+    parser.add_argument('--cache-max-size', type=float, metavar='MB',
+                        help='evict least recently used cache entries above this size')
+    parser.add_argument('--output', default='.', metavar='DIR',
+                        help='directory of exported files, paths of requests are relative to it')
+    parser.add_argument('--max-models', type=int, default=16, metavar='N',
+                        help='number of variants kept in memory')
+    args = parser.parse_args()
+
+    if args.send:
+        response = request(args.socket, json.loads(args.send))
+        print(json.dumps(response))
+        sys.exit(0 if response['ok'] else 1)
+
+    directory = args.cache or tempfile.mkdtemp(prefix='lcr-case-')
+    cache = ShapeCache(directory,
+                       max_size=args.cache_max_size and int(args.cache_max_size * 1024 * 1024))
+    try:
+        serve(args.socket, ModelServer(cache, args.output, args.max_models))
+    finally:
+        if not args.cache:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,28 +1,88 @@
+from collections import OrderedDict
+from functools import lru_cache
+
 from zencad import *
 
 from api import BBox
 
 
+@lru_cache(maxsize=16)
+def halfspace_tool(normal_vector):
+    """
+    Halfspace bounded by the plane through the origin, built once for every normal, slices
+    only move it.
+
+    :type normal_vector: (float, float, float)
+    :rtype: pyservoce.libservoce.Shape
+    """
+    if normal_vector == (0, 0, 1):
+        rotate_trans = rotateX(deg(180))
+    else:
+        rotate_trans = short_rotate((0, 0, -1), normal_vector)
+    return rotate_trans(halfspace())
+
+
+@lru_cache(maxsize=64)
+def plane_tool(normal_vector, center):
+    """
+    Halfspace bounded by the plane through `center`, shared by slices with the same plane.
+
+    :type normal_vector: (float, float, float)
+    :type center: (float, float, float)
+    :rtype: pyservoce.libservoce.Shape
+    """
+    return halfspace_tool(normal_vector).move(vector3(*center))
+
+
+def _bbox(shape):
+    """
+    :param shape: shape, or object whose bounding box is already known
+    :type shape: pyservoce.libservoce.Shape | ZenObj
+    :rtype: BBox
+    """
+    bbox = shape.bbox()
+    return bbox if isinstance(bbox, BBox) else BBox.from_zen_bbox(bbox)
+
+
 class SliceBase(object):
+    max_results = 32
+
     def __init__(self, cut):
+        """
+        :param cut: intersection tool
+        :type cut: pyservoce.libservoce.Shape
+        """
         self.cut = cut
+        # Recent intersections by shape ids, shapes are kept with them, so the ids stay unique
+        self.__results = OrderedDict()
 
     def __call__(self, shape):
-        return shape ^ self.cut
+        result = self.__results.get(id(shape))
+        if result is not None:
+            self.__results.move_to_end(id(shape))
+            return result[1]
+
+        result = (shape, shape ^ self.cut)
+        self.__results[id(shape)] = result
+        if len(self.__results) > self.max_results:
+            self.__results.popitem(last=False)
+        return result[1]
 
     def __mul__(self, other):
+        if isinstance(other, SliceBase):
+            # A single tool intersects every shape once instead of once per slice
+            return SliceBase(self.cut ^ other.cut)
         return lambda shape: self(other(shape))
 
 
 class SliceShape(SliceBase):
     def __init__(self, shape, normal_vector=(0, 1, 0), trans=None):
         """
-        :type shape: pyservoce.libservoce.Shape
+        :param shape: shape or object to slice through the center of its bounding box
+        :type shape: pyservoce.libservoce.Shape | ZenObj
         """
-        rotate_trans = short_rotate((0, 0, -1), normal_vector)
-        cut = rotate_trans(halfspace())
-        bbox = BBox.from_zen_bbox(shape.bbox())
-        cut = cut.move(bbox.center_offset)
+        center = _bbox(shape).center_offset
+        cut = plane_tool(tuple(normal_vector), (center.x, center.y, center.z))
         if trans is not None:
             cut = trans(cut)
         super().__init__(cut)
@@ -33,12 +93,7 @@ class SlicePoint(SliceBase):
         """
         :type center: pyservoce.libservoce.vector3
         """
-        if normal_vector == (0, 0, 1):
-            rotate_trans = rotateX(deg(180))
-        else:
-            rotate_trans = short_rotate((0, 0, -1), normal_vector)
-        cut = rotate_trans(halfspace())
-        cut = cut.move(center)
+        cut = plane_tool(tuple(normal_vector), (center.x, center.y, center.z))
         if trans is not None:
             cut = trans(cut)
         super().__init__(cut)
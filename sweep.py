@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Parameter sweep: builds and exports many case variants in a process pool.
+
+A sweep file is a JSON (or YAML, if PyYAML is installed) object:
+
+    {
+        "parts": ["top", "bottom"],
+        "delta": 0.01,
+        "base": {"CaseProperties.smd_margin": 2.5},
+        "grid": {"config.LEVER_ANGLE": [0, 30], "CaseProperties.pcb_margin": [1.6, 1.8]},
+        "variants": [{"name": "tight", "overrides": {"CaseProperties.socket_margin": 0.2}}],
+        "clearance": {"spacing": 0.3, "margins": {"device.button_cap": 0.2}}
+    }
+
+Override names are either `config.<NAME>` or `<ClassName>.<attribute>` for the classes
+in `case_model` and `device_model`. Every combination of `grid` values and every entry
+of `variants` is a variant, `base` overrides apply to all of them, unknown names are
+errors. Variants which differ only in case parameters share a `Device` build, such groups
+are split into chunks so that every worker process gets a part of the sweep.
+
+If `clearance` is given, every variant is checked for interference between the device
+and the case (see `clearance.py` for the options), violations are listed in the manifest.
+"""
+import argparse
+import importlib
+import itertools
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+import headless  # noqa: F401, defers the viewer, must precede the first import of zencad
+
+import case_model
+import config
+import device_model
+from api import OverriddenNamespace, Parameters, Translation
+from clearance import check_clearances, component_shapes
+from export import StlExporter, export_shape
+
+PART_CLASSES = {
+    'top': 'CaseTop',
+    'bottom': 'CaseBottom',
+}
+
+
+class Variant(object):
+    def __init__(self, name, overrides):
+        """
+        :type name: str
+        :param overrides: parameter values by `config.<NAME>` or `<ClassName>.<attribute>`
+        :type overrides: dict[str, object]
+        """
+        self.name = name
+        self.overrides = overrides
+
+    def device_overrides(self):
+        """
+        Returns the overrides which affect the device model.
+
+        :rtype: dict[str, object]
+        """
+        config_overrides, device_overrides, _ = split_overrides(self.overrides)
+        overrides = {f'config.{k}': v for k, v in config_overrides.items()}
+        for owner, values in device_overrides.items():
+            overrides.update({f'{owner}.{k}': v for k, v in values.items()})
+        return overrides
+
+
+def load_variants(path):
+    """
+    :type path: str
+    :rtype: (dict, list[Variant])
+    """
+    with open(path) as f:
+        if path.endswith(('.yaml', '.yml')):
+            if yaml is None:
+                raise RuntimeError('PyYAML is required to read YAML sweep files')
+            spec = yaml.safe_load(f)
+        else:
+            spec = json.load(f)
+
+    base = spec.get('base', {})
+    variants = []
+
+    grid = spec.get('grid', {})
+    if grid:
+        names = sorted(grid)
+        for values in itertools.product(*(grid[n] for n in names)):
+            overrides = dict(base, **dict(zip(names, values)))
+            variants.append(Variant(f'variant-{len(variants) + 1:03d}', overrides))
+
+    for v in spec.get('variants', []):
+        name = v.get('name', f'variant-{len(variants) + 1:03d}')
+        variants.append(Variant(name, dict(base, **v.get('overrides', {}))))
+
+    return spec, variants
+
+
+def split_overrides(overrides):
+    """
+    Splits overrides into config values, device class and case class attributes.
+
+    :type overrides: dict[str, object]
+    :rtype: (dict[str, object], dict[str, dict[str, object]], dict[str, dict[str, object]])
+    :raises ValueError: if a name doesn't match a model parameter
+    """
+    config_overrides = {}
+    device_overrides = {}
+    case_overrides = {}
+    for key, value in overrides.items():
+        owner, _, name = key.partition('.')
+        if owner == 'config':
+            if not name.isupper() or not hasattr(config, name):
+                raise ValueError(f'Unknown parameter {key!r}')
+            config_overrides[name] = value
+            continue
+
+        for module, module_overrides in ((device_model, device_overrides),
+                                         (case_model, case_overrides)):
+            cls = getattr(module, owner, None)
+            if isinstance(cls, Parameters) and cls.__module__ == module.__name__:
+                break
+        else:
+            raise ValueError(f'Unknown parameter {key!r}')
+        if not name or not hasattr(cls, name):
+            raise ValueError(f'Unknown parameter {key!r}')
+        module_overrides.setdefault(owner, {})[name] = value
+    return config_overrides, device_overrides, case_overrides
+
+
+def apply_overrides(overrides):
+    """
+    Reloads config and model modules with the overridden parameters.
+
+    :type overrides: dict[str, object]
+    """
+    config_overrides, device_overrides, case_overrides = split_overrides(overrides)
+
+    # Re-execute the config module so that derived values (e.g. EPS2) follow overrides
+    namespace = OverriddenNamespace(config_overrides)
+    with open(config.__file__) as f:
+        exec(compile(f.read(), config.__file__, 'exec'), vars(config), namespace)
+    vars(config).update(namespace)
+
+    Parameters.overrides = dict(device_overrides, **case_overrides)
+    importlib.reload(device_model)
+    importlib.reload(case_model)
+
+
+def apply_case_overrides(overrides):
+    """
+    Reloads only the case model with the overridden case parameters, objects built from
+    the device model stay valid.
+
+    :type overrides: dict[str, object]
+    """
+    _, _, case_overrides = split_overrides(overrides)
+    Parameters.overrides = case_overrides
+    importlib.reload(case_model)
+
+
+def group_variants(variants, workers):
+    """
+    Groups variants with the same device parameters, groups larger than the share of a
+    worker are split into chunks, every chunk builds its own `Device`.
+
+    :type variants: list[Variant]
+    :param workers: number of worker processes
+    :type workers: int
+    :rtype: list[list[Variant]]
+    """
+    groups = {}
+    for variant in variants:
+        key = json.dumps(variant.device_overrides(), sort_keys=True)
+        groups.setdefault(key, []).append(variant)
+
+    chunk_size = max(1, math.ceil(len(variants) / workers))
+    return [group[i:i + chunk_size]
+            for group in groups.values() for i in range(0, len(group), chunk_size)]
+
+
+def build_group(variants, parts, delta, output, clearance=None):
+    """
+    Builds variants sharing the same device parameters in a single worker.
+
+    :type variants: list[Variant]
+    :type parts: list[str]
+    :type delta: float
+    :type output: str
+    :param clearance: keyword arguments of `check_clearances`, no checks if `None`
+    :type clearance: None | dict
+    :return: manifest entries
+    :rtype: list[dict]
+    """
+    apply_overrides(variants[0].device_overrides())
+    device = device_model.Device()
+    battery = device_model.Battery()
+
+    # Files are the same as exported by main.py with this deviation
+    exporter = StlExporter(delta)
+    entries = []
+    for variant in variants:
+        apply_case_overrides(variant.overrides)
+        properties = case_model.CaseProperties
+        variant_device = device.transformed(Translation(properties.pcb_offset))
+        variant_battery = battery.transformed(Translation(properties.battery_offset))
+
+        files = {}
+        shapes = {}
+        for part in parts if clearance is None else PART_CLASSES:
+            cls = getattr(case_model, PART_CLASSES[part])
+            shapes[part] = cls(variant_device, variant_battery).shape
+        for part in parts:
+            path = os.path.join(output, f'{variant.name}-{part}.stl')
+            print(f'Writing "{part}" model of {variant.name} to {path}...')
+            export_shape(shapes[part], [path], exporter, part)
+            files[part] = path
+
+        entry = {'name': variant.name, 'overrides': variant.overrides, 'files': files}
+        if clearance is not None:
+            components = component_shapes(variant_device, variant_battery)
+            violations = check_clearances(components, shapes, **clearance)
+            entry['clearance'] = [v.to_dict() for v in violations]
+        entries.append(entry)
+    return entries
+
+
+def run(path, output, jobs=None):
+    """
+    :param path: sweep file
+    :type path: str
+    :param output: output directory
+    :type output: str
+    :param jobs: number of worker processes, CPU count by default
+    :type jobs: None | int
+    :return: path to the manifest file
+    :rtype: str
+    """
+    spec, variants = load_variants(path)
+    parts = spec.get('parts', list(PART_CLASSES))
+    delta = spec.get('delta', 0.01)
+    os.makedirs(output, exist_ok=True)
+
+    chunks = group_variants(variants, jobs or os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [
+            executor.submit(build_group, chunk, parts, delta, output, spec.get('clearance'))
+            for chunk in chunks
+        ]
+        entries = [e for future in futures for e in future.result()]
+
+    manifest_path = os.path.join(output, 'manifest.json')
+    with open(manifest_path, 'w') as f:
+        json.dump({'delta': delta, 'variants': entries}, f, indent=2)
+    return manifest_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build case variants from a parameter sweep')
+    parser.add_argument('sweep', help='JSON or YAML sweep file')
+    parser.add_argument('--output', default='sweep', help='output directory')
+    parser.add_argument('--jobs', type=int, help='number of worker processes')
+    args = parser.parse_args()
+
+    manifest_path = run(args.sweep, args.output, args.jobs)
+    print(f'Manifest written to {manifest_path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+from collections import namedtuple
+from functools import reduce
+
+import numpy
+import pytest
+from zencad import vector3
+
+from api import BBox, BBoxBatch, BoxTree, CompoundZenObj, SimpleZenObj, Translation
+
+Point = namedtuple('Point', ['x', 'y', 'z'])
+
+
+def _random_boxes(count, seed=0):
+    rng = numpy.random.default_rng(seed)
+    mins = rng.uniform(-50.0, 50.0, (count, 3))
+    maxs = mins + rng.uniform(0.0, 20.0, (count, 3))
+    return [BBox(*numpy.stack([lo, hi], axis=1).ravel().tolist()) for lo, hi in zip(mins, maxs)]
+
+
+def _distance(box, point):
+    outside = [max(lo - p, p - hi, 0.0)
+               for lo, hi, p in zip(box.bounds[0::2], box.bounds[1::2], point)]
+    return sum(d ** 2 for d in outside) ** 0.5
+
+
+def test_union():
+    boxes = _random_boxes(50)
+    assert BBoxBatch.from_boxes(boxes).union().bounds == reduce(lambda a, b: a + b, boxes).bounds
+
+
+def test_intersection():
+    boxes = _random_boxes(50)
+    other = BBox(-10.0, 10.0, -20.0, 5.0, 0.0, 30.0)
+    intersections = BBoxBatch.from_boxes(boxes).intersection(other)
+    empty = intersections.empty()
+    for box, intersection, is_empty in zip(boxes, intersections, empty):
+        assert is_empty == (not box.overlaps(other))
+        if not is_empty:
+            assert intersection.bounds == (
+                max(box.xmin, other.xmin), min(box.xmax, other.xmax),
+                max(box.ymin, other.ymin), min(box.ymax, other.ymax),
+                max(box.zmin, other.zmin), min(box.zmax, other.zmax),
+            )
+
+
+def test_overlaps_brute_force():
+    boxes = _random_boxes(40)
+    others = _random_boxes(30, seed=1)
+    # Touching boxes overlap
+    others.append(BBox(boxes[0].xmax, boxes[0].xmax + 1.0, boxes[0].ymin, boxes[0].ymax,
+                       boxes[0].zmin, boxes[0].zmax))
+    overlaps = BBoxBatch.from_boxes(boxes).overlaps(BBoxBatch.from_boxes(others))
+    assert overlaps.shape == (len(boxes), len(others))
+    assert overlaps[0, -1]
+    for i, box in enumerate(boxes):
+        for j, other in enumerate(others):
+            assert overlaps[i, j] == box.overlaps(other)
+
+
+def test_with_border_per_box():
+    boxes = BBoxBatch.from_boxes(_random_boxes(3))
+    grown = boxes.with_border(numpy.array([0.0, 1.0, 2.5]))
+    for box, grown_box, width in zip(boxes, grown, (0.0, 1.0, 2.5)):
+        assert grown_box.bounds == pytest.approx(box.with_border(width).bounds)
+
+
+@pytest.mark.parametrize('count', [1, 8, 9, 200])
+def test_box_tree_query_brute_force(count):
+    boxes = _random_boxes(count)
+    tree = BoxTree(list(range(count)), BBoxBatch.from_boxes(boxes))
+    for region in _random_boxes(40, seed=2):
+        expected = [i for i, box in enumerate(boxes) if box.overlaps(region)]
+        assert sorted(tree.query(region)) == expected
+
+
+@pytest.mark.parametrize('count', [1, 8, 9, 200])
+def test_box_tree_nearest_brute_force(count):
+    boxes = _random_boxes(count)
+    tree = BoxTree(list(range(count)), BBoxBatch.from_boxes(boxes))
+    rng = numpy.random.default_rng(3)
+    for point in rng.uniform(-80.0, 80.0, (40, 3)).tolist():
+        expected = sorted(_distance(box, point) for box in boxes)[:5]
+        found = tree.nearest(Point(*point), 5)
+        assert [d for d, _ in found] == pytest.approx(expected)
+        for distance, i in found:
+            assert distance == pytest.approx(_distance(boxes[i], point))
+
+
+def test_compound_query_follows_translation():
+    boxes = _random_boxes(30)
+    compound = CompoundZenObj(**{f'part{i}': SimpleZenObj(None, bbox=box)
+                                 for i, box in enumerate(boxes)})
+    region = BBox(-20.0, 20.0, -20.0, 20.0, -20.0, 20.0)
+    assert [name for name, _ in compound.query(region)] == \
+        [f'part{i}' for i, box in enumerate(boxes) if box.overlaps(region)]
+
+    vector = vector3(5.0, -3.0, 1.0)
+    moved = compound.transformed(Translation(vector))
+    assert sorted(name for name, _ in moved.query(region)) == \
+        sorted(f'part{i}' for i, box in enumerate(boxes) if box.moved(vector).overlaps(region))
+
+    distance, name, _ = compound.nearest(Point(100.0, 0.0, 0.0))[0]
+    assert distance == pytest.approx(min(_distance(box, (100.0, 0.0, 0.0)) for box in boxes))
@@ -0,0 +1,40 @@
+import pytest
+
+from export import Mesh, Node
+
+
+def _square():
+    # Two faces sharing the edge from (1, 0, 0) to (1, 1, 0)
+    return [
+        ([Node(0.0, 0.0, 0.0), Node(1.0, 0.0, 0.0), Node(1.0, 1.0, 0.0)], [(0, 1, 2)]),
+        ([Node(1.0, 0.0, 0.0), Node(2.0, 0.5, 0.25), Node(1.0, 1.0, 0.0)], [(0, 1, 2)]),
+    ]
+
+
+def test_mesh_merges_shared_nodes():
+    mesh = Mesh(_square())
+    assert len(mesh.nodes) == 4
+    assert mesh.triangles == [(0, 1, 2), (1, 3, 2)]
+
+
+def test_mesh_round_trip(tmp_path):
+    mesh = Mesh(_square())
+    path = str(tmp_path / 'square.mesh')
+    mesh.write(path)
+    loaded = Mesh.read(path)
+    assert loaded.nodes == mesh.nodes
+    assert loaded.triangles == mesh.triangles
+
+
+def test_empty_mesh_round_trip(tmp_path):
+    path = str(tmp_path / 'empty.mesh')
+    Mesh(()).write(path)
+    loaded = Mesh.read(path)
+    assert loaded.nodes == [] and loaded.triangles == []
+
+
+def test_mesh_read_rejects_other_files(tmp_path):
+    path = tmp_path / 'other.mesh'
+    path.write_bytes(b'solid x\n' + bytes(32))
+    with pytest.raises(ValueError):
+        Mesh.read(str(path))
@@ -0,0 +1,43 @@
+from api import Parameters, fingerprint
+from features import Feature
+
+SCREWS = {}
+
+
+class ScrewInfo(object):
+    def __init__(self, screw_class):
+        self.screw_class = screw_class
+
+
+def _screw_class(**overrides):
+    Parameters.overrides = {'Screw': overrides}
+    try:
+        class Screw(object, metaclass=Parameters):
+            radius = 1.1
+            length = 8.0
+            cap_r = 2.0
+            cap_diameter = cap_r * 2
+        return Screw
+    finally:
+        Parameters.overrides = {}
+
+
+def _mounts(case, device):
+    return [info.screw_class.radius for info in SCREWS.values()]
+
+
+def test_fingerprint_follows_overrides():
+    assert fingerprint(_screw_class()) == fingerprint(_screw_class())
+    assert fingerprint(_screw_class()) != fingerprint(_screw_class(cap_r=2.2))
+
+
+def test_screw_override_changes_key(monkeypatch):
+    feature = Feature('mounts', _mounts, params=('SCREWS',))
+    monkeypatch.setitem(globals(), 'SCREWS', {'silver': ScrewInfo(_screw_class())})
+    key = feature.key('root', None)
+    monkeypatch.setitem(globals(), 'SCREWS', {'silver': ScrewInfo(_screw_class())})
+    assert feature.key('root', None) == key
+
+    for overrides in ({'radius': 1.2}, {'length': 6.0}, {'cap_r': 2.5}):
+        monkeypatch.setitem(globals(), 'SCREWS', {'silver': ScrewInfo(_screw_class(**overrides))})
+        assert feature.key('root', None) != key
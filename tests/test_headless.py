@@ -0,0 +1,25 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_export_does_not_import_qt(tmp_path):
+    pytest.importorskip('zencad')
+    # A fresh interpreter, as other tests may have imported zencad already
+    script = textwrap.dedent(f'''
+        import headless
+        from zencad import box
+
+        from export import StlExporter, export_shape
+
+        paths = [{str(tmp_path / 'box.stl')!r}, {str(tmp_path / 'box.3mf')!r}]
+        export_shape(box(size=(10, 10, 10)), paths, StlExporter(0.1))
+        assert not headless.viewer_imported(), 'Qt is imported by the export'
+    ''')
+    subprocess.run([sys.executable, '-c', script], cwd=ROOT, check=True)
+    assert (tmp_path / 'box.stl').exists()
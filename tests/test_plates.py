@@ -0,0 +1,65 @@
+import random
+
+import pytest
+
+from export import Node
+from plates import PlateItem, Skyline, pack
+
+
+class _Mesh(object):
+    def __init__(self, width, depth, height):
+        self.nodes = [Node(x, y, z)
+                      for x in (1.0, 1.0 + width)
+                      for y in (-2.0, -2.0 + depth)
+                      for z in (3.0, 3.0 + height)]
+        self.triangles = []
+
+
+def _rectangles(placements):
+    rectangles = []
+    for placement in placements:
+        nodes = placement.nodes()
+        assert min(n.z for n in nodes) == pytest.approx(0.0)
+        rectangles.append((min(n.x for n in nodes), max(n.x for n in nodes),
+                           min(n.y for n in nodes), max(n.y for n in nodes)))
+    return rectangles
+
+
+def test_skyline():
+    skyline = Skyline(100.0, 50.0)
+    assert skyline.find(60.0, 30.0) == (30.0, 0.0, 0.0)
+    skyline.add(0.0, 0.0, 60.0, 30.0)
+    assert skyline.find(40.0, 40.0) == (40.0, 60.0, 0.0)
+    assert skyline.find(50.0, 10.0) == (40.0, 0.0, 30.0)
+    assert skyline.find(101.0, 10.0) is None
+    skyline.add(60.0, 0.0, 40.0, 30.0)
+    assert skyline.segments == [(0.0, 30.0, 100.0)]
+
+
+@pytest.mark.parametrize('rotate', [False, True])
+def test_pack_without_overlaps(rotate):
+    random.seed(1)
+    items = [(PlateItem(f'part{i}', _Mesh(random.uniform(10.0, 80.0),
+                                         random.uniform(10.0, 80.0), 5.0), None),
+              random.randint(1, 4))
+             for i in range(12)]
+    width, depth, spacing = 220.0, 200.0, 5.0
+    plates = pack(items, width, depth, spacing, rotate)
+    assert sum(len(p) for p in plates) == sum(count for _, count in items)
+
+    for placements in plates:
+        rectangles = _rectangles(placements)
+        for xmin, xmax, ymin, ymax in rectangles:
+            assert xmin >= spacing - 1e-6 and xmax <= width - spacing + 1e-6
+            assert ymin >= spacing - 1e-6 and ymax <= depth - spacing + 1e-6
+        for i, a in enumerate(rectangles):
+            for b in rectangles[i + 1:]:
+                gap = max(b[0] - a[1], a[0] - b[1], b[2] - a[3], a[2] - b[3])
+                assert gap >= spacing - 1e-6
+
+
+def test_pack_rotates_long_parts():
+    item = PlateItem('long', _Mesh(10.0, 150.0, 5.0), None)
+    assert pack([(item, 1)], 200.0, 100.0, 5.0, rotate=True)[0][0].rotated
+    with pytest.raises(ValueError):
+        pack([(item, 1)], 200.0, 100.0, 5.0, rotate=False)
@@ -0,0 +1,33 @@
+import pytest
+
+from sweep import Variant, group_variants, split_overrides
+
+
+def test_split_overrides():
+    config_overrides, device_overrides, case_overrides = split_overrides({
+        'config.LEVER_ANGLE': 0,
+        'Pcb.hole_r': 1.6,
+        'CaseProperties.socket_margin': 0.2,
+        'CaseProperties.pcb_margin': 1.6,
+    })
+    assert config_overrides == {'LEVER_ANGLE': 0}
+    assert device_overrides == {'Pcb': {'hole_r': 1.6}}
+    assert case_overrides == {'CaseProperties': {'socket_margin': 0.2, 'pcb_margin': 1.6}}
+
+
+@pytest.mark.parametrize('key', [
+    'CaseProperties.sokcet_margin', 'config.LEVER_ANGEL', 'config.cos', 'Pbc.hole_r',
+    'CaseProperties', 'Size.x',
+])
+def test_split_overrides_rejects_unknown_names(key):
+    with pytest.raises(ValueError, match=key):
+        split_overrides({key: 1.0})
+
+
+def test_group_variants_splits_large_groups():
+    variants = [Variant(f'v{i}', {'CaseProperties.socket_margin': 0.1 * i}) for i in range(10)]
+    variants.append(Variant('lever', {'config.LEVER_ANGLE': 0}))
+    chunks = group_variants(variants, 4)
+    assert [len(c) for c in chunks] == [3, 3, 3, 1, 1]
+    assert [v for c in chunks for v in c] == variants
+    assert len(group_variants(variants, 1)) == 2
@@ -0,0 +1,178 @@
+"""
+Watch mode: rebuilds the displayed model when its source files change.
+
+A changed module is reloaded together with the watched modules which import it. Case parts
+reuse memoized features with unchanged inputs, the device and the battery are rebuilt only
+if their module, the config or their placement change. Only objects whose shapes changed
+are replaced in the viewer, the others stay displayed as they are.
+"""
+import importlib
+import os
+import traceback
+
+from zencad import display
+
+import case_model
+import config
+import device_model
+from api import fingerprint
+
+# Every module is reloaded together with the modules following it, which import it
+WATCHED_MODULES = (config, device_model, case_model)
+
+
+class SourceWatcher(object):
+    def __init__(self, modules):
+        """
+        :type modules: typing.Iterable[types.ModuleType]
+        """
+        self.__mtimes = {m: self.__mtime(m) for m in modules}
+
+    @staticmethod
+    def __mtime(module):
+        """
+        :rtype: None | float
+        """
+        try:
+            return os.stat(module.__file__).st_mtime
+        except OSError:
+            # Some editors replace files on save, so they are missing for a moment
+            return None
+
+    def changed(self):
+        """
+        :return: modules whose files changed since the previous call
+        :rtype: list[types.ModuleType]
+        """
+        changed = []
+        for module, mtime in self.__mtimes.items():
+            current = self.__mtime(module)
+            if current is not None and current != mtime:
+                self.__mtimes[module] = current
+                changed.append(module)
+        return changed
+
+
+def reload_modules(changed):
+    """
+    Reloads changed modules and the watched modules which import them.
+
+    :type changed: list[types.ModuleType]
+    :return: reloaded modules
+    :rtype: tuple[types.ModuleType]
+    """
+    reloaded = WATCHED_MODULES[min(WATCHED_MODULES.index(m) for m in changed):]
+    for module in reloaded:
+        importlib.reload(module)
+    return reloaded
+
+
+class LiveModel(object):
+    """
+    Model rebuilt by the animation thread of the viewer when its sources change.
+
+    :type interval: float
+    """
+    # Seconds between checks of the source files
+    interval = 0.5
+
+    def __init__(self, create_internals, create_model):
+        """
+        :param create_internals: creates the device and the battery
+        :type create_internals: () -> (CompoundZenObj, SimpleZenObj)
+        :param create_model: creates the model around the device and the battery
+        :type create_model: ((CompoundZenObj, SimpleZenObj)) -> CompoundZenObj
+        """
+        self.__create_internals = create_internals
+        self.__create_model = create_model
+        self.__watcher = SourceWatcher(WATCHED_MODULES)
+        self.__internals = None
+        self.__placement = None
+        self.__prepare = None
+        self.__trans = None
+        # Displayed shapes and their interactive objects by dotted names
+        self.__displayed = {}
+
+    @staticmethod
+    def __internals_placement():
+        """
+        :rtype: str
+        """
+        properties = case_model.CaseProperties
+        return fingerprint((properties.pcb_offset, properties.battery_offset))
+
+    def build(self, reloaded=()):
+        """
+        Builds the model, reusing the device and the battery unless the `reloaded` modules
+        or their placement affect them.
+
+        :type reloaded: tuple[types.ModuleType]
+        :rtype: CompoundZenObj
+        """
+        placement = self.__internals_placement()
+        if (self.__internals is None or placement != self.__placement or
+                config in reloaded or device_model in reloaded):
+            self.__internals = self.__create_internals()
+            self.__placement = placement
+        return self.__create_model(self.__internals)
+
+    def display(self, all_objects, prepare, trans=None):
+        """
+        Displays the model, `animate` replaces its objects after rebuilds.
+
+        :type all_objects: CompoundZenObj
+        :param prepare: function applied to every model before display, e.g. hiding parts
+        :type prepare: (CompoundZenObj) -> None
+        :type trans: None | (pyservoce.libservoce.Shape) -> pyservoce.libservoce.Shape
+        """
+        self.__prepare = prepare
+        self.__trans = trans
+        self.__update(all_objects)
+
+    def __update(self, all_objects, scene=None):
+        """
+        :type all_objects: CompoundZenObj
+        :param scene: the default scene if `None`
+        :type scene: None | pyservoce.Scene
+        :return: number of replaced objects
+        :rtype: int
+        """
+        self.__prepare(all_objects)
+        leaves = {
+            name: (shape, colour)
+            for name, shape, colour in all_objects.leaves(visible_only=True)
+        }
+        for name in set(self.__displayed) - set(leaves):
+            self.__displayed.pop(name)[1].hide(True)
+
+        replaced = 0
+        for name, (shape, colour) in leaves.items():
+            previous = self.__displayed.get(name)
+            # Unchanged case parts come from the feature memo and devices are reused
+            if previous and previous[0] is shape:
+                continue
+            if previous:
+                previous[1].hide(True)
+            shown = self.__trans(shape) if self.__trans else shape
+            self.__displayed[name] = (shape, display(shown, color=colour, scene=scene))
+            replaced += 1
+        return replaced
+
+    def animate(self, state):
+        """
+        Animation callback of the viewer, rebuilds the model if its sources changed.
+
+        :type state: zencad.animate.AnimationState
+        """
+        changed = self.__watcher.changed()
+        if not changed:
+            return
+
+        print(f'Reloading {", ".join(m.__name__ for m in changed)}...')
+        try:
+            replaced = self.__update(self.build(reload_modules(changed)), state.scene)
+        except Exception:
+            # The previous model stays displayed until the sources are fixed
+            traceback.print_exc()
+            return
+        print(f'Ok, {replaced} objects replaced')